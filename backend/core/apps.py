@@ -46,6 +46,8 @@ class CoreConfig(AppConfig):
             controller.start()
 
         if start_raveberry:
+            from core import base
+            from core import leader
             from core import tasks
             from core import redis
             from core.musiq import musiq
@@ -56,16 +58,30 @@ class CoreConfig(AppConfig):
 
             logging.info("starting raveberry")
 
-            redis.start()
-            tasks.start()
-
-            worker.start()
-            # platforms needs to start before musiq because mopidy_available is checked there
-            platforms.start()
-            musiq.start()
-            basic.start()
+            def start_workers(takeover: bool) -> None:
+                # Only the leader among all worker processes runs the background loops.
+                # Requests are served by every process.
+                if takeover:
+                    # The other processes keep serving clients, so their shared state is kept,
+                    # even if this process was just started.
+                    # Only undo the shutdown of the old leader.
+                    redis.put("stop_playback_loop", False)
+                    playback.buzzer_stopped.clear()
+                else:
+                    # processes that stopped unexpectedly did not write their visitors
+                    base.flush_visitors()
+                    redis.start()
+                tasks.start()
+
+                worker.start()
+                # platforms needs to start before musiq because mopidy_available is checked there
+                platforms.start()
+                musiq.start()
+                basic.start()
 
             def stop_workers() -> None:
+                if not leader.is_leader():
+                    return
                 # wake up the playback thread and stop it
                 redis.put("stop_playback_loop", True)
                 playback.queue_changed.set()
@@ -76,4 +92,14 @@ class CoreConfig(AppConfig):
                 # wake up the listener thread with an instruction to stop the lights worker
                 redis.connection.publish("lights_settings_changed", "stop")
 
+                # the visitor count is removed from redis when the next leader starts
+                base.flush_visitors()
+
+                leader.resign()
+
+            leader.run(start_workers)
+
+            from core.musiq import suggestions
+
+            suggestions.start()
             atexit.register(stop_workers)
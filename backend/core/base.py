@@ -5,7 +5,6 @@ import random
 from typing import Any, Dict
 
 from django.core.handlers.wsgi import WSGIRequest
-from django.db import transaction
 from django.http import HttpResponseBadRequest, HttpResponseRedirect
 from django.http.response import HttpResponse, JsonResponse
 from django.shortcuts import render
@@ -17,7 +16,11 @@ from core.lights import controller
 from core.musiq import musiq
 from core.settings import storage
 from core.settings import system
-from core.state_handler import send_state
+from core.state_handler import PAGES, request_update, send_state, snapshot
+from core.util import run_later
+
+# seconds between writing the visitor count to the database
+VISITORS_FLUSH_INTERVAL = 5
 
 
 def _get_random_hashtag() -> str:
@@ -37,13 +40,54 @@ def _get_apk_link() -> str:
     return "https://github.com/raveberry/shareberry/releases/latest/download/shareberry.apk"
 
 
+# The visitor count is kept in redis while raveberry is running,
+# so page views neither write to the database nor update every client.
+# The database is updated at most once per interval, followed by a state update.
+_increment_visitors = redis.connection.register_script(
+    """
+    if redis.call("EXISTS", KEYS[1]) == 1 then
+        return redis.call("INCR", KEYS[1])
+    end
+    return false
+    """
+)
+
+
+def _load_visitors() -> None:
+    value = models.Counter.objects.get_or_create(id=1, defaults={"value": 0})[0].value
+    # another process might have loaded and incremented the count in the meantime
+    redis.connection.set("visitors", value, nx=True)
+
+
+def get_visitors() -> int:
+    """Returns the number of page views."""
+    value = redis.connection.get("visitors")
+    if value is None:
+        _load_visitors()
+        value = redis.connection.get("visitors")
+    return int(value)
+
+
 def _increment_counter() -> int:
-    with transaction.atomic():
-        counter = models.Counter.objects.get_or_create(id=1, defaults={"value": 0})[0]
-        counter.value += 1
-        counter.save()
+    visitors = _increment_visitors(keys=["visitors"])
+    if visitors is None:
+        _load_visitors()
+        visitors = _increment_visitors(keys=["visitors"])
+    run_later("flush_visitors", VISITORS_FLUSH_INTERVAL, _flush_visitors)
+    return visitors
+
+
+def flush_visitors() -> None:
+    """Writes the visitor count from redis to the database.
+    Called on shutdown, before redis is cleared, so the visits since the last write are kept."""
+    visitors = redis.connection.get("visitors")
+    if visitors is not None:
+        models.Counter.objects.filter(id=1).update(value=int(visitors))
+
+
+def _flush_visitors() -> None:
+    flush_visitors()
     update_state()
-    return counter.value
 
 
 def context(request: WSGIRequest) -> Dict[str, Any]:
@@ -99,9 +143,7 @@ def state_dict() -> Dict[str, Any]:
     return {
         "partymode": user_manager.partymode_enabled(),
         "users": user_manager.get_count(),
-        "visitors": models.Counter.objects.get_or_create(id=1, defaults={"value": 0})[
-            0
-        ].value,
+        "visitors": get_visitors(),
         "lightsEnabled": redis.get("lights_active"),
         "playbackError": redis.get("playback_error"),
         "alarm": redis.get("alarm_playing"),
@@ -157,5 +199,12 @@ def upgrade_available(_request: WSGIRequest) -> HttpResponse:
 
 
 def update_state() -> None:
-    """Sends an update event to all connected clients."""
-    send_state(state_dict())
+    """Schedules an update event for all connected clients."""
+    request_update("base")
+
+
+def send_update() -> None:
+    """Sends an update event to the clients of all pages."""
+    text = snapshot("base", state_dict)
+    for page in PAGES:
+        send_state(page, text)
@@ -0,0 +1,132 @@
+"""This module elects the leader among multiple worker processes.
+Raveberry can be served by several daphne processes that share redis and the database.
+Requests are handled by every process, but the background loops
+(playback, lights, scheduled tasks) must only run once.
+The process holding the leader key in redis runs them."""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+from core import redis
+
+# the name of the redis key holding the token of the current leader
+LEADER_KEY = "leader"
+# seconds after which the leadership expires if it is not renewed
+LEADER_TIMEOUT = 10
+# seconds between two renewals, multiple renewals fit into one timeout
+RENEW_INTERVAL = LEADER_TIMEOUT / 3
+
+# identifies this process across all hosts sharing the redis instance
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+# every running process holds a key with this prefix, renewed like the leadership
+WORKER_PREFIX = "workers:"
+
+# extends the leadership, but only if it is still held with the given token
+_renew = redis.connection.register_script(
+    """
+    if redis.call("GET", KEYS[1]) == ARGV[1] then
+        return redis.call("EXPIRE", KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+)
+
+_leading = threading.Event()
+# identifies the current term of this process as leader, a new one is created for every election
+_token: Optional[str] = None
+# set when this process shuts down, it must not be elected afterwards
+_resigned = threading.Event()
+
+
+def is_leader() -> bool:
+    """Returns whether this process currently runs the background loops."""
+    return _leading.is_set()
+
+
+def token() -> Optional[str]:
+    """Returns the token of the current term of this process as leader, None for followers.
+    The background loops are started with it and check it with holds()."""
+    return _token if _leading.is_set() else None
+
+
+def holds(leader_token: Optional[str]) -> bool:
+    """Returns whether the term identified by the given token is still going on.
+    Loops started by a leader check this in every iteration and stop once the term ended,
+    so a leader that was replaced while it was unresponsive does not keep
+    a second set of loops running. Loops started without a leader are not fenced."""
+    return leader_token is None or redis.connection.get(LEADER_KEY) == leader_token
+
+
+def _beat() -> None:
+    redis.connection.set(WORKER_PREFIX + WORKER_ID, 1, ex=LEADER_TIMEOUT)
+
+
+def _others_alive() -> bool:
+    return any(
+        key != WORKER_PREFIX + WORKER_ID
+        for key in redis.connection.scan_iter(match=WORKER_PREFIX + "*", count=1000)
+    )
+
+
+def _claim() -> bool:
+    global _token
+    new_token = f"{WORKER_ID}-{uuid.uuid4().hex[:8]}"
+    if not redis.connection.set(LEADER_KEY, new_token, nx=True, ex=LEADER_TIMEOUT):
+        return False
+    _token = new_token
+    return True
+
+
+def _campaign(on_elected: Callable[[bool], None]) -> None:
+    while not _resigned.is_set():
+        time.sleep(RENEW_INTERVAL)
+        try:
+            if not _resigned.is_set():
+                _beat()
+            if _leading.is_set():
+                if not _renew(keys=[LEADER_KEY], args=[_token, LEADER_TIMEOUT]):
+                    # Another process took over while this one was unresponsive.
+                    # The loops of the lost term notice that it ended and stop,
+                    # so this process can be elected again later.
+                    logging.error("worker %s lost the leadership", WORKER_ID)
+                    _leading.clear()
+            elif not _resigned.is_set() and _claim():
+                logging.info("worker %s took over the leadership", WORKER_ID)
+                _leading.set()
+                on_elected(True)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("leader election failed")
+
+
+def resign() -> None:
+    """Gives up the leadership so another process can take over without waiting
+    for the timeout. Called when this process shuts down."""
+    _resigned.set()
+    redis.connection.delete(WORKER_PREFIX + WORKER_ID)
+    if _leading.is_set():
+        _renew(keys=[LEADER_KEY], args=[_token, 0])
+        _leading.clear()
+
+
+def run(on_elected: Callable[[bool], None]) -> None:
+    """Takes part in the election of the leader.
+    If this process is elected, on_elected is called.
+    Its argument is True if other processes are already serving clients,
+    either because this process took over from a leader that stopped
+    or because it was restarted while the others kept running.
+    It is False if no other process is alive, e.g. when the first process starts.
+    The leadership is renewed in a background thread for as long as this process runs."""
+    # checked before this process announces itself
+    others_alive = _others_alive()
+    _beat()
+    if _claim():
+        logging.info("worker %s is the leader", WORKER_ID)
+        _leading.set()
+        on_elected(others_alive)
+    else:
+        logging.info("worker %s is a follower", WORKER_ID)
+    threading.Thread(target=_campaign, args=(on_elected,), daemon=True).start()
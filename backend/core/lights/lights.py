@@ -11,7 +11,7 @@ from django.shortcuts import render
 
 from core import user_manager, base, redis, util
 from core.settings import storage
-from core.state_handler import send_state
+from core.state_handler import request_update, send_state, snapshot
 
 
 def state_dict() -> Dict[str, Any]:
@@ -69,5 +69,10 @@ def index(request: WSGIRequest) -> HttpResponse:
 
 
 def update_state() -> None:
-    """Sends an update event to all connected clients."""
-    send_state(state_dict())
+    """Schedules an update event for all connected clients."""
+    request_update("lights")
+
+
+def send_update() -> None:
+    """Sends an update event to all clients of the lights page."""
+    send_state("lights", snapshot("lights", state_dict))
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import logging
 import math
 import os
 import shutil
@@ -14,7 +15,7 @@ from typing import Dict, Optional, NamedTuple, Tuple, TypedDict, cast
 from django.db import connection
 
 from django.conf import settings as conf
-from core import redis
+from core import leader, redis
 from core.tasks import app
 from core.lights import controller, lights
 from core.lights import leds
@@ -64,7 +65,7 @@ class Devices(NamedTuple):
 
 def start() -> None:
     """Initializes this module by starting the lights loop."""
-    _loop.delay()
+    _loop.delay(leader.token())
     connection.close()
 
 
@@ -73,7 +74,9 @@ class DeviceManager:
     This class maintains state, but only in the worker thread that updates the lights.
     This keeps the necessary variables local to the thread, avoiding db/redis queries each frame."""
 
-    def __init__(self) -> None:
+    def __init__(self, leader_token: Optional[str] = None) -> None:
+        # the term of the leader that started this loop, see leader.holds
+        self.leader_token = leader_token
 
         self.loop_active: Optional[Event] = Event()
 
@@ -133,7 +136,8 @@ class DeviceManager:
         for message in pubsub.listen():
             settings_changed = message["data"]
 
-            if settings_changed == "stop":
+            # once the term ended, any message stops the listener of the previous leader
+            if settings_changed == "stop" or not leader.holds(self.leader_token):
                 # delete the lock the main thread is checking each loop in order to stop it
                 # this removes the need for an extra redis variable
                 # that would need to be checked every loop
@@ -141,6 +145,9 @@ class DeviceManager:
                     self.loop_active.set()
                     self.loop_active = None
                 break
+            if settings_changed.startswith("stop "):
+                # the loop of a previous leader stopped, see loop()
+                continue
 
             if settings_changed == "alarm_started":
                 self.alarm_started()
@@ -149,8 +156,11 @@ class DeviceManager:
                 self.alarm_stopped()
                 continue
 
-            # flush the cache before accessing the database so no stale data is read
-            storage.cache.clear()
+            # The settings were changed before this notification was published,
+            # but the listener of this process receives the broadcast of the change
+            # on its own connection and might not have cleared the cache yet.
+            # Clear it here, so the changed settings are read from the database.
+            storage.clear_cache()
 
             if settings_changed == "adjust_screen":
                 self.devices.screen.adjust()
@@ -345,6 +355,17 @@ class DeviceManager:
                 self.listener.join()
                 break
 
+            if not leader.holds(self.leader_token):
+                # another leader took over and runs its own lights loop
+                logging.error("stopping the lights loop of a previous leader")
+                # wake up the listener thread so it notices the end of the term as well
+                redis.connection.publish(
+                    "lights_settings_changed", f"stop {self.leader_token}"
+                )
+                self.devices.screen.program.stop()
+                self.listener.join()
+                break
+
             computation_start = time.time()
 
             with lights_lock:
@@ -399,7 +420,7 @@ class DeviceManager:
 
 
 @app.task
-def _loop() -> None:
-    manager = DeviceManager()
+def _loop(leader_token: Optional[str] = None) -> None:
+    manager = DeviceManager(leader_token)
     manager.loop()
     connection.close()
@@ -0,0 +1,60 @@
+"""This module contains the benchmarkshuffle command."""
+
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+
+class _Rollback(Exception):
+    """Raised to discard the songs created for the benchmark."""
+
+
+class Command(BaseCommand):
+    """Defines the benchmarkshuffle command."""
+
+    help = (
+        "Measures the latency of shuffling queues of different lengths "
+        "on the configured database. The queue is left unchanged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+        parser.add_argument("--repetitions", type=int, default=10)
+
+    def handle(self, *args, **options):
+        from core.models import QueuedSong
+
+        queue = QueuedSong.objects
+        self.stdout.write(f"database: {connection.vendor}")
+        for size in options["sizes"]:
+            durations = []
+            try:
+                with transaction.atomic():
+                    queue.enqueue_many(
+                        [
+                            {
+                                "artist": "Raveberry",
+                                "title": f"Benchmark {index}",
+                                "duration": 60,
+                                "internal_url": "benchmark",
+                                "external_url": "https://raveberry.party/benchmark",
+                                "stream_url": None,
+                            }
+                            for index in range(size)
+                        ],
+                        False,
+                    )
+                    for _ in range(options["repetitions"]):
+                        start = time.perf_counter()
+                        queue.shuffle()
+                        durations.append(time.perf_counter() - start)
+                    raise _Rollback()
+            except _Rollback:
+                pass
+            self.stdout.write(
+                f"{size:>6} songs: "
+                f"median {statistics.median(durations) * 1000:8.2f} ms, "
+                f"max {max(durations) * 1000:8.2f} ms"
+            )
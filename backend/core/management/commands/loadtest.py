@@ -0,0 +1,102 @@
+"""This module contains the loadtest command."""
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import requests
+from django.conf import settings as conf
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _hammer(urls: List[str], duration: float) -> int:
+    """Requests the given urls in turn until the duration has passed.
+    Returns the number of successful requests."""
+    session = requests.Session()
+    completed = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        url = urls[completed % len(urls)]
+        try:
+            if session.get(url, timeout=10).ok:
+                completed += 1
+        except requests.exceptions.RequestException:
+            pass
+    return completed
+
+
+def _wait_until_ready(url: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return True
+        except requests.exceptions.RequestException:
+            time.sleep(0.5)
+    return False
+
+
+class Command(BaseCommand):
+    """Defines the loadtest command."""
+
+    help = (
+        "Starts different numbers of daphne worker processes and measures "
+        "the request throughput they achieve together. "
+        "Requires redis and the configured database to be running."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+        parser.add_argument("--duration", type=float, default=10)
+        parser.add_argument("--clients", type=int, default=os.cpu_count() or 4)
+        parser.add_argument("--path", default="/ajax/musiq/state/")
+        parser.add_argument("--port", type=int, default=9100)
+
+    def handle(self, *args, **options):
+        daphne = shutil.which(
+            "daphne", path=os.path.dirname(sys.executable)
+        ) or shutil.which("daphne")
+        if not daphne:
+            raise CommandError("daphne is not installed")
+
+        self.stdout.write(f"{os.cpu_count()} cores, {options['clients']} clients")
+        for worker_count in options["workers"]:
+            ports = [options["port"] + index for index in range(worker_count)]
+            urls = [f"http://127.0.0.1:{port}{options['path']}" for port in ports]
+            processes = [
+                subprocess.Popen(
+                    [daphne, "-p", str(port), "main.asgi:application"],
+                    cwd=conf.BASE_DIR,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+                for port in ports
+            ]
+            try:
+                for url in urls:
+                    if not _wait_until_ready(url, timeout=60):
+                        raise CommandError(f"{url} did not respond")
+                with ProcessPoolExecutor(options["clients"]) as executor:
+                    # every client starts at a different worker
+                    futures = [
+                        executor.submit(
+                            _hammer,
+                            urls[client % len(urls) :] + urls[: client % len(urls)],
+                            options["duration"],
+                        )
+                        for client in range(options["clients"])
+                    ]
+                    completed = sum(future.result() for future in futures)
+            finally:
+                for process in processes:
+                    process.terminate()
+                for process in processes:
+                    process.wait()
+            self.stdout.write(
+                f"{worker_count:>3} workers: "
+                f"{completed / options['duration']:8.1f} requests/s"
+            )
@@ -12,7 +12,7 @@ class Command(BaseCommand):
     )
 
     def handle(self, *args, **options):
-        from core.models import ArchivedSong
+        from core.models import ArchivedPlaylist, ArchivedSong
         from core.musiq.song_provider import SongProvider
 
         for song in ArchivedSong.objects.all():
@@ -40,3 +40,7 @@ class Command(BaseCommand):
                 # keep old data but store that the song is not cached
                 song.cached = False
             song.save()
+        # playlists store whether their first song is cached
+        for playlist in ArchivedPlaylist.objects.all():
+            song_utils.update_playlist_entries_info(playlist)
+        song_utils.archive_changed()
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_alter_setting_value"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="queuedsong",
+            index=models.Index(
+                fields=["-votes", "index"], name="core_queuedsong_votes"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="queuedsong",
+            index=models.Index(
+                condition=models.Q(("internal_url__isnull", False)),
+                fields=["-votes", "index"],
+                name="core_queuedsong_confirmed",
+            ),
+        ),
+    ]
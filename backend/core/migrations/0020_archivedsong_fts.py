@@ -0,0 +1,90 @@
+from django.db import migrations, connection
+
+# SQLite has no trigram similarity. Instead, a full text index over the artist, title
+# and queries of every song is kept in sync with triggers. Postgres uses trigram indexes.
+fts_sql = [
+    """
+    CREATE VIRTUAL TABLE core_archivedsong_fts
+    USING fts5(artist, title, queries, prefix='2 3')
+    """,
+    """
+    INSERT INTO core_archivedsong_fts(rowid, artist, title, queries)
+    SELECT song.id, song.artist, song.title, coalesce(
+        (SELECT group_concat(query.query, ' ') FROM core_archivedquery query
+        WHERE query.song_id = song.id), ''
+    ) FROM core_archivedsong song
+    """,
+    """
+    CREATE TRIGGER core_archivedsong_fts_insert AFTER INSERT ON core_archivedsong
+    BEGIN
+        INSERT INTO core_archivedsong_fts(rowid, artist, title, queries)
+        VALUES (new.id, new.artist, new.title, '');
+    END
+    """,
+    """
+    CREATE TRIGGER core_archivedsong_fts_update
+    AFTER UPDATE OF artist, title ON core_archivedsong
+    BEGIN
+        UPDATE core_archivedsong_fts SET artist = new.artist, title = new.title
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_archivedsong_fts_delete AFTER DELETE ON core_archivedsong
+    BEGIN
+        DELETE FROM core_archivedsong_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_archivedquery_fts_insert AFTER INSERT ON core_archivedquery
+    BEGIN
+        UPDATE core_archivedsong_fts SET queries = queries || ' ' || new.query
+        WHERE rowid = new.song_id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_archivedquery_fts_update AFTER UPDATE ON core_archivedquery
+    BEGIN
+        UPDATE core_archivedsong_fts SET queries = coalesce(
+            (SELECT group_concat(query, ' ') FROM core_archivedquery
+            WHERE song_id = core_archivedsong_fts.rowid), ''
+        ) WHERE rowid IN (old.song_id, new.song_id);
+    END
+    """,
+    """
+    CREATE TRIGGER core_archivedquery_fts_delete AFTER DELETE ON core_archivedquery
+    BEGIN
+        UPDATE core_archivedsong_fts SET queries = coalesce(
+            (SELECT group_concat(query, ' ') FROM core_archivedquery
+            WHERE song_id = old.song_id), ''
+        ) WHERE rowid = old.song_id;
+    END
+    """,
+]
+
+reverse_fts_sql = [
+    "DROP TRIGGER core_archivedquery_fts_delete",
+    "DROP TRIGGER core_archivedquery_fts_update",
+    "DROP TRIGGER core_archivedquery_fts_insert",
+    "DROP TRIGGER core_archivedsong_fts_delete",
+    "DROP TRIGGER core_archivedsong_fts_update",
+    "DROP TRIGGER core_archivedsong_fts_insert",
+    "DROP TABLE core_archivedsong_fts",
+]
+
+
+def fts5_available() -> bool:
+    # FTS5 is an optional SQLite extension, which some builds do not include
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return ("ENABLE_FTS5",) in cursor.fetchall()
+
+
+class Migration(migrations.Migration):
+    dependencies = [("core", "0019_queuedsong_vote_indexes")]
+
+    operations = (
+        [migrations.RunSQL(fts_sql, reverse_fts_sql)] if fts5_available() else []
+    )
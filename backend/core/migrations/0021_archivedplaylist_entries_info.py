@@ -0,0 +1,53 @@
+from django.db import migrations, models
+
+
+def determine_url_type(url):
+    # Migrations must not depend on application code,
+    # so this is a copy of core.musiq.song_utils.determine_url_type
+    if url.startswith("local_library/"):
+        return "local"
+    if url.startswith("https://www.youtube.com/") or url.startswith(
+        "https://music.youtube.com/"
+    ):
+        return "youtube"
+    if url.startswith("https://open.spotify.com/"):
+        return "spotify"
+    if url.startswith("https://soundcloud.com/"):
+        return "soundcloud"
+    if url.startswith("https://www.jamendo.com/"):
+        return "jamendo"
+    return "unknown"
+
+
+def fill_entries_info(apps, schema_editor):
+    ArchivedPlaylist = apps.get_model("core", "ArchivedPlaylist")
+    ArchivedSong = apps.get_model("core", "ArchivedSong")
+    for playlist in ArchivedPlaylist.objects.all():
+        first_entry = playlist.entries.order_by("index").first()
+        if playlist.list_id.startswith("playlog"):
+            playlist.platform = "playlog"
+        elif first_entry is not None:
+            playlist.platform = determine_url_type(first_entry.url)
+        playlist.first_entry_cached = (
+            first_entry is not None
+            and ArchivedSong.objects.filter(url=first_entry.url, cached=True).exists()
+        )
+        playlist.save(update_fields=["platform", "first_entry_cached"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [("core", "0020_archivedsong_fts")]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedplaylist",
+            name="platform",
+            field=models.CharField(blank=True, default="", max_length=20),
+        ),
+        migrations.AddField(
+            model_name="archivedplaylist",
+            name="first_entry_cached",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(fill_entries_info, migrations.RunPython.noop),
+    ]
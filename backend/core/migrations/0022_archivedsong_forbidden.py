@@ -0,0 +1,93 @@
+import re
+
+from django.db import migrations, models
+
+# Adding the field recreates the table on SQLite, which drops the triggers
+# that keep the full text index of migration 0020 in sync. They are created again.
+# Migrations must not depend on application code, so the statements are copied.
+song_trigger_sql = [
+    """
+    CREATE TRIGGER core_archivedsong_fts_insert AFTER INSERT ON core_archivedsong
+    BEGIN
+        INSERT INTO core_archivedsong_fts(rowid, artist, title, queries)
+        VALUES (new.id, new.artist, new.title, '');
+    END
+    """,
+    """
+    CREATE TRIGGER core_archivedsong_fts_update
+    AFTER UPDATE OF artist, title ON core_archivedsong
+    BEGIN
+        UPDATE core_archivedsong_fts SET artist = new.artist, title = new.title
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_archivedsong_fts_delete AFTER DELETE ON core_archivedsong
+    BEGIN
+        DELETE FROM core_archivedsong_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+reverse_song_trigger_sql = [
+    "DROP TRIGGER IF EXISTS core_archivedsong_fts_delete",
+    "DROP TRIGGER IF EXISTS core_archivedsong_fts_update",
+    "DROP TRIGGER IF EXISTS core_archivedsong_fts_insert",
+]
+
+
+def _execute_if_indexed(statements):
+    def _execute(apps, schema_editor):
+        # the index only exists if SQLite supported FTS5 when migration 0020 was applied
+        connection = schema_editor.connection
+        with connection.cursor() as cursor:
+            table_names = connection.introspection.table_names(cursor)
+        if "core_archivedsong_fts" not in table_names:
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return _execute
+
+
+drop_song_triggers = _execute_if_indexed(reverse_song_trigger_sql)
+create_song_triggers = _execute_if_indexed(song_trigger_sql)
+
+
+def fill_forbidden(apps, schema_editor):
+    ArchivedSong = apps.get_model("core", "ArchivedSong")
+    Setting = apps.get_model("core", "Setting")
+    setting = Setting.objects.filter(key="forbidden_keywords").first()
+    if setting is None:
+        return
+    # every keyword is a regular expression, as in core.musiq.song_utils.is_forbidden
+    words = [word for word in re.split(r"[,\s]+", setting.value.strip()) if word]
+    patterns = [re.compile(word, re.IGNORECASE) for word in words]
+    if not patterns:
+        return
+    forbidden_ids = [
+        song_id
+        for song_id, artist, title in ArchivedSong.objects.values_list(
+            "id", "artist", "title"
+        ).iterator()
+        if any(pattern.search(artist) or pattern.search(title) for pattern in patterns)
+    ]
+    for start in range(0, len(forbidden_ids), 500):
+        ArchivedSong.objects.filter(id__in=forbidden_ids[start : start + 500]).update(
+            forbidden=True
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [("core", "0021_archivedplaylist_entries_info")]
+
+    operations = [
+        migrations.RunPython(drop_song_triggers, create_song_triggers),
+        migrations.AddField(
+            model_name="archivedsong",
+            name="forbidden",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(create_song_triggers, drop_song_triggers),
+        migrations.RunPython(fill_forbidden, migrations.RunPython.noop),
+    ]
@@ -40,6 +40,8 @@ class Counter(models.Model):
 class ArchivedSong(models.Model):
     """Stores an archived song.
     url identifies the song uniquely in the database and on the internet (if applicable).
+    forbidden stores whether artist or title contain a forbidden keyword,
+    so filtered songs can be excluded in queries.
     """
 
     url = models.CharField(max_length=2000, unique=True)
@@ -48,10 +50,17 @@ class ArchivedSong(models.Model):
     duration = models.FloatField()
     counter = models.IntegerField()
     cached = models.BooleanField()
+    forbidden = models.BooleanField(default=False)
 
     def __str__(self) -> str:
         return self.title + " (" + self.url + "): " + str(self.counter)
 
+    def save(self, *args, **kwargs) -> None:
+        self.forbidden = song_utils.is_forbidden(
+            self.artist
+        ) or song_utils.is_forbidden(self.title)
+        super().save(*args, **kwargs)
+
     def displayname(self) -> str:
         """Formats the song using the utility method."""
         return song_utils.displayname(self.artist, self.title)
@@ -86,6 +95,8 @@ class ArchivedSong(models.Model):
 class ArchivedPlaylist(models.Model):
     """Stores an archived playlist.
     url identifies the playlist uniquely in the database and on the internet (if applicable).
+    platform and first_entry_cached are derived from the entries,
+    so suggestions can filter playlists without querying them.
     """
 
     id: int
@@ -94,6 +105,8 @@ class ArchivedPlaylist(models.Model):
     title = models.CharField(max_length=1000)
     created = models.DateTimeField(auto_now_add=True)
     counter = models.IntegerField()
+    platform = models.CharField(max_length=20, blank=True, default="")
+    first_entry_cached = models.BooleanField(default=False)
 
     def __str__(self) -> str:
         return self.title + ": " + str(self.counter)
@@ -176,6 +189,16 @@ class QueuedSong(models.Model):
 
     class Meta:
         ordering = ["index"]
+        indexes = [
+            # the queue is ordered by votes during voting
+            models.Index(fields=["-votes", "index"], name="core_queuedsong_votes"),
+            # only confirmed songs are selected for playback
+            models.Index(
+                fields=["-votes", "index"],
+                condition=models.Q(internal_url__isnull=False),
+                name="core_queuedsong_confirmed",
+            ),
+        ]
 
 
 class CurrentSong(models.Model):
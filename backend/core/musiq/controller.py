@@ -19,9 +19,13 @@ from django.views.decorators.csrf import csrf_exempt
 from core import models, redis, user_manager
 from core.musiq import musiq, playback, player
 from core.settings import storage
-from core.util import extract_value
+from core.util import extract_value, run_later
 
 SEEK_DISTANCE = 10
+# buffered votes are applied after this many seconds
+VOTE_FLUSH_INTERVAL = 0.1
+# or as soon as this many votes are buffered
+VOTE_FLUSH_THRESHOLD = 50
 
 
 def control(func: Callable) -> Callable:
@@ -279,7 +283,8 @@ def reorder(request: WSGIRequest) -> HttpResponse:
 @user_manager.tracked
 def vote(request: WSGIRequest) -> HttpResponse:
     """Modify the vote-count of the given song by the given amount.
-    If a song receives too many downvotes, it is removed."""
+    The vote is buffered and applied together with other votes shortly after.
+    If a song receives too many downvotes, it is removed immediately."""
     key_param = request.POST.get("key")
     amount_param = request.POST.get("amount")
     if key_param is None or amount_param is None:
@@ -297,31 +302,76 @@ def vote(request: WSGIRequest) -> HttpResponse:
     if storage.get("color_indication") != storage.Privileges.nobody:
         user_manager.register_vote(request, key, amount)
 
-    models.CurrentSong.objects.filter(queue_key=key).update(votes=F("votes") + amount)
+    # Votes are buffered in redis and written to the database in batches.
+    # During a drop, hundreds of votes arrive within a few seconds,
+    # updating the database and all clients for every single one is too expensive.
+    with redis.connection.pipeline() as pipe:
+        pipe.hincrby("vote_deltas", str(key), amount)
+        pipe.incr("buffered_votes")
+        pending, buffered = pipe.execute()
+
+    if buffered >= VOTE_FLUSH_THRESHOLD or (amount < 0 and _kick_pending(key, pending)):
+        flush_votes()
+    else:
+        run_later("flush_votes", VOTE_FLUSH_INTERVAL, flush_votes)
+    return HttpResponse()
+
+
+def _kick_pending(key: int, pending: int) -> bool:
+    """Returns whether the given song would be removed once its pending votes are applied.
+    Songs need to be kicked immediately, without waiting for the next flush."""
+    votes = (
+        models.CurrentSong.objects.filter(queue_key=key)
+        .values_list("votes", flat=True)
+        .first()
+    )
+    if votes is None:
+        votes = playback.queue.filter(id=key).values_list("votes", flat=True).first()
+    if votes is None:
+        return False
+    return (
+        votes + pending
+        <= -storage.get(  # pylint: disable=invalid-unary-operand-type
+            "downvotes_to_kick"
+        )
+    )
+
+
+def flush_votes() -> None:
+    """Applies all buffered votes to the database.
+    Removes songs that received too many downvotes and sends a single state update."""
+    with redis.connection.pipeline() as pipe:
+        pipe.hgetall("vote_deltas")
+        pipe.delete("vote_deltas", "buffered_votes")
+        deltas, _ = pipe.execute()
+    deltas = {int(key): int(delta) for key, delta in deltas.items() if int(delta) != 0}
+    if not deltas:
+        return
+
+    threshold = -storage.get(  # pylint: disable=invalid-unary-operand-type
+        "downvotes_to_kick"
+    )
+    removed_songs = []
+    for key, delta in deltas.items():
+        models.CurrentSong.objects.filter(queue_key=key).update(
+            votes=F("votes") + delta
+        )
+        removed = playback.queue.vote(key, delta, threshold)
+        if removed is not None:
+            removed_songs.append(removed)
+
     try:
         current_song = models.CurrentSong.objects.get()
-        if (
-            current_song.queue_key == key
-            and current_song.votes
-            <= -storage.get(  # pylint: disable=invalid-unary-operand-type
-                "downvotes_to_kick"
-            )
-        ):
+        if current_song.queue_key in deltas and current_song.votes <= threshold:
             _skip()
     except models.CurrentSong.DoesNotExist:
         pass
 
-    removed = playback.queue.vote(
-        key,
-        amount,
-        -storage.get("downvotes_to_kick"),  # pylint: disable=invalid-unary-operand-type
-    )
     # if we removed a song by voting, and it was added by autoplay,
     # we want it to be the new basis for autoplay
-    if removed is not None:
+    for removed in removed_songs:
         if not removed.manually_requested:
             playback.handle_autoplay(removed.external_url or removed.title)
         else:
             playback.handle_autoplay()
     musiq.update_state()
-    return HttpResponse()
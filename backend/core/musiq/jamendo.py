@@ -179,10 +179,12 @@ class JamendoSongProvider(SongProvider, Jamendo):
             params={"id": self.id, "limit": storage.get("max_playlist_items")},
         )
 
-        for track in result["results"]:
-            external_url = track["shareurl"]
-            provider = JamendoSongProvider(external_url, None)
-            provider.request("", archive=False, manually_requested=False)
+        providers: List[SongProvider] = [
+            JamendoSongProvider(track["shareurl"], None) for track in result["results"]
+        ]
+        SongProvider.request_many(
+            providers, "", archive=False, manually_requested=False
+        )
 
         return HttpResponse("queueing radio")
 
@@ -18,11 +18,11 @@ from core.settings import storage
 from core.musiq import player
 
 # this lock is released when restarting mopidy (which happens in another Thread)
+# it is stored in redis, so commands of all worker processes are serialized
 mopidy_lock = redis.connection.lock("mopidy_lock", thread_local=False)
 
-# this creates two PLAYER objects, once in the playback worker
-# and once in the request handler
-# during testing, both are the same process and thus only one instance is created
+# every worker process creates its own PLAYER object.
+# Only the leader uses it for playback, the others for handling requests
 PLAYER = MopidyAPI(host=conf.MOPIDY_HOST, port=conf.MOPIDY_PORT)
 
 
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from typing import Optional
+from typing import Any, Optional
 
 from core.musiq import musiq, playback
 from core.settings import storage
@@ -78,16 +78,9 @@ class MusicProvider:
         """Updates the placeholder in the song queue with the actual data."""
         raise NotImplementedError()
 
-    def request(
-        self, session_key: str, archive: bool = True, manually_requested: bool = True
-    ) -> None:
-        """Tries to request this resource.
-        Uses the local cache if possible, otherwise tries to retrieve it online."""
-
-        if 0 < storage.get("max_queue_length") <= playback.queue.count():
-            self.error = "Queue limit reached"
-            raise ProviderError(self.error)
-
+    def prepare_request(self) -> Any:
+        """Checks whether this resource can be requested.
+        Raises a ProviderError if not, otherwise returns the task that enqueues it."""
         enqueue_function = enqueue
 
         if not self.check_cached():
@@ -109,6 +102,20 @@ class MusicProvider:
             if self.on_cooldown():
                 raise ProviderError(self.error)
 
+        return enqueue_function
+
+    def request(
+        self, session_key: str, archive: bool = True, manually_requested: bool = True
+    ) -> None:
+        """Tries to request this resource.
+        Uses the local cache if possible, otherwise tries to retrieve it online."""
+
+        if 0 < storage.get("max_queue_length") <= playback.queue.count():
+            self.error = "Queue limit reached"
+            raise ProviderError(self.error)
+
+        enqueue_function = self.prepare_request()
+
         self.enqueue_placeholder(manually_requested)
 
         enqueue_function.delay(self, session_key, archive)
@@ -2,7 +2,6 @@
 
 from __future__ import annotations
 
-import ast
 import importlib
 import logging
 import os
@@ -24,7 +23,7 @@ from core.musiq.music_provider import MusicProvider, ProviderError, WrongUrlErro
 from core.musiq.playlist_provider import PlaylistProvider
 from core.musiq.song_provider import SongProvider
 from core.settings import storage
-from core.state_handler import send_state
+from core.state_handler import request_update, send_state_patch
 from core.settings.storage import PlatformEnabled, PlatformSuggestions
 
 queue = QueuedSong.objects
@@ -225,23 +224,36 @@ def index(request: WSGIRequest) -> HttpResponse:
     return render(request, "musiq.html", context)
 
 
-def _add_color_indication(engagement, song_dict) -> None:
-    requested_by = None
-    votes = {}
-    if engagement is not None:
-        requested_by, votes = ast.literal_eval(engagement)
-    song_dict["requestedBy"] = user_manager.color_of(requested_by)
-    song_dict["requesterVote"] = votes.get(requested_by, 0)
-    song_dict["upvotes"] = []
-    song_dict["downvotes"] = []
-    for session_key, amount in votes.items():
-        if session_key == requested_by:
-            continue
-        color = user_manager.color_of(session_key)
-        if amount > 0:
-            song_dict["upvotes"].append(color)
-        else:
-            song_dict["downvotes"].append(color)
+def _color_indications(queue_keys: List[int]) -> List[Dict[str, Any]]:
+    # fetches the engagement of all given songs and the colors of all involved sessions
+    # with a constant number of redis round-trips
+    if not queue_keys:
+        return []
+    engagements = user_manager.get_engagements(queue_keys)
+    session_keys = set()
+    for requested_by, votes in engagements:
+        session_keys.add(requested_by)
+        session_keys.update(votes)
+    colors = user_manager.colors_of(session_keys)
+
+    indications = []
+    for requested_by, votes in engagements:
+        indication: Dict[str, Any] = {
+            "requestedBy": colors.get(requested_by),
+            "requesterVote": votes.get(requested_by, 0),
+            "upvotes": [],
+            "downvotes": [],
+        }
+        for session_key, amount in votes.items():
+            if session_key == requested_by:
+                continue
+            color = colors.get(session_key)
+            if amount > 0:
+                indication["upvotes"].append(color)
+            else:
+                indication["downvotes"].append(color)
+        indications.append(indication)
+    return indications
 
 
 def state_dict() -> Dict[str, Any]:
@@ -264,8 +276,7 @@ def state_dict() -> Dict[str, Any]:
             current_song_dict["duration"]
         )
         if storage.get("color_indication") != storage.Privileges.nobody:
-            engagement = redis.connection.get(f"engagement-{current_song.queue_key}")
-            _add_color_indication(engagement, current_song_dict)
+            current_song_dict.update(_color_indications([current_song.queue_key])[0])
         musiq_state["currentSong"] = current_song_dict
 
         paused = storage.get("paused")
@@ -285,21 +296,26 @@ def state_dict() -> Dict[str, Any]:
 
     song_queue = []
     total_time = 0
-    all_songs = queue.all()
+    all_songs = list(queue.all())
+    # the stored index is only an ordering key, clients expect the position
+    positions = {song.id: position for position, song in enumerate(all_songs, start=1)}
     if storage.get("interactivity") in [
         storage.Interactivity.upvotes_only,
         storage.Interactivity.full_voting,
     ]:
-        all_songs = all_songs.order_by("-votes", "index")
-    for song in all_songs:
+        # the sort is stable, songs with equal votes stay in queue order
+        all_songs.sort(key=lambda song: -song.votes)
+    indications: List[Dict[str, Any]] = [{} for _ in all_songs]
+    if storage.get("color_indication"):
+        indications = _color_indications([song.id for song in all_songs])
+    for song, indication in zip(all_songs, indications):
         song_dict = model_to_dict(song)
         song_dict = util.camelize(song_dict)
+        song_dict["index"] = positions[song.id]
         song_dict["durationFormatted"] = song_utils.format_seconds(
             song_dict["duration"]
         )
-        if storage.get("color_indication"):
-            engagement = redis.connection.get(f"engagement-{song.id}")
-            _add_color_indication(engagement, song_dict)
+        song_dict.update(indication)
         song_queue.append(song_dict)
         if song_dict["duration"] < 0:
             # skip duration of placeholders
@@ -337,6 +353,30 @@ def state_dict() -> Dict[str, Any]:
     return state
 
 
+def advance_state(state: Dict[str, Any], seconds: float) -> bool:
+    """Advances the progress of the given state by the given number of seconds.
+    Returns whether the state depends on time, i.e. whether a song is playing."""
+    musiq_state = state["musiq"]
+    current_song = musiq_state["currentSong"]
+    if (
+        musiq_state["paused"]
+        or current_song is None
+        # the alarm and backup streams have no progress
+        or current_song["queueKey"] == -1
+        or current_song["duration"] <= 0
+    ):
+        return False
+    musiq_state["progress"] = min(
+        100, musiq_state["progress"] + seconds / current_song["duration"] * 100
+    )
+    return True
+
+
 def update_state() -> None:
-    """Sends an update event to all connected clients."""
-    send_state(state_dict())
+    """Schedules an update event for all connected clients."""
+    request_update("musiq")
+
+
+def send_update() -> None:
+    """Sends an update event to all clients of the musiq page."""
+    send_state_patch("musiq", state_dict)
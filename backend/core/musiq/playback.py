@@ -10,10 +10,10 @@ import time
 from typing import Optional, Tuple
 
 from django.conf import settings as conf
-from django.db import connection, transaction
+from django.db import connection
 from django.utils import timezone
 
-from core import models, redis, user_manager
+from core import leader, models, redis, user_manager
 from core.lights import controller as lights_controller
 from core.musiq import musiq
 from core.settings import storage
@@ -36,15 +36,17 @@ def start() -> None:
     paused = storage.get("paused")
     redis.put("paused", paused)
     _handle_buzzer.delay()
-    _loop.delay()
+    _loop.delay(leader.token())
 
 
 class Playback:
     """Class containing all playback related methods."""
 
-    def __init__(self):
+    def __init__(self, leader_token: Optional[str] = None):
         from core.musiq.fake_player import FakePlayer
 
+        # the term of the leader that started this playback, see leader.holds
+        self.leader_token = leader_token
         redis.put("playing", False)
 
         queue.delete_placeholders()
@@ -119,12 +121,15 @@ class Playback:
             # recover interrupted song from database
             return models.CurrentSong.objects.get(), True
 
+        # clear the event before checking the queue.
+        # Every change afterwards wakes up the loop, earlier changes are already visible
+        queue_changed.clear()
         if queue.count() == 0:
-            queue_changed.wait()
-            queue_changed.clear()
+            # stop requests are signaled through the event as well
+            if not redis.get("stop_playback_loop"):
+                queue_changed.wait()
 
-            # restart the loop to check again whether songs are available
-            # in case of a false wakeup this causes as to wait again
+            # restart the loop to check whether it should stop or which song is available
             return None, False
 
         # select the next song depending on settings
@@ -133,10 +138,12 @@ class Playback:
             storage.Interactivity.upvotes_only,
             storage.Interactivity.full_voting,
         ]:
-            with transaction.atomic():
-                song = queue.confirmed().order_by("-votes", "index")[0]
-                song_id = song.id
-                queue.remove(song.id)
+            # apply buffered votes first, they might change which song has the most votes
+            from core.musiq import controller
+
+            controller.flush_votes()
+            song = queue.pop_highest_voted()
+            song_id = -1 if song is None else song.id
         elif storage.get("shuffle"):
             confirmed = queue.confirmed()
             index = random.randint(0, confirmed.count() - 1)
@@ -249,7 +256,7 @@ class Playback:
             # if (timezone.now() - current_song.created).total_seconds() > current_song.duration:
             #    break
             time.sleep(0.1)
-            if redis.get("stop_playback_loop"):
+            if redis.get("stop_playback_loop") or not leader.holds(self.leader_token):
                 # in order to stop the playback thread, return False, making the main loop restart.
                 # it will check this variable again and terminate itself.
                 return False
@@ -294,6 +301,10 @@ class Playback:
         ):
             self.play_alarm(from_buzzer=False)
 
+        if redis.get("queue_rebalance_requested"):
+            redis.put("queue_rebalance_requested", False)
+            queue.rebalance()
+
         if not queue.exists() and storage.get("backup_stream"):
             redis.put("backup_playing", True)
             self.player().play_backup_stream()
@@ -305,6 +316,11 @@ class Playback:
         Takes a song from the queue and plays it until it is finished."""
 
         while True:
+            if not leader.holds(self.leader_token):
+                # another leader took over and runs its own playback loop
+                logging.error("stopping the playback loop of a previous leader")
+                break
+
             if redis.get("playback_error"):
                 # sleep for a short while so continuing errors don't lead to busy loops
                 time.sleep(0.5)
@@ -354,8 +370,8 @@ class Playback:
 
 
 @app.task
-def _loop() -> None:
-    playback = Playback()
+def _loop(leader_token: Optional[str] = None) -> None:
+    playback = Playback(leader_token)
     playback.loop()
     connection.close()
 
@@ -1,9 +1,7 @@
 """This module contains the base class of all playlist providers."""
 import logging
-import time
 from typing import List, Optional, Type
 
-from django.conf import settings
 from django.db import transaction
 from django.db.models.expressions import F
 
@@ -43,7 +41,7 @@ class PlaylistProvider(MusicProvider):
             logging.error("archived song requested for nonexistent key %s", key)
             raise ValueError from error
 
-        playlist_type = song_utils.determine_playlist_type(archived_playlist)
+        playlist_type = archived_playlist.platform
         provider_class: Optional[Type[PlaylistProvider]] = None
         if playlist_type == "local":
             from core.musiq.local import LocalPlaylistProvider
@@ -181,6 +179,7 @@ class PlaylistProvider(MusicProvider):
                     PlaylistEntry.objects.create(
                         playlist=archived_playlist, index=index, url=url
                     )
+                song_utils.update_playlist_entries_info(archived_playlist)
             else:
                 if archive:
                     queryset.update(counter=F("counter") + 1)
@@ -190,6 +189,7 @@ class PlaylistProvider(MusicProvider):
             ArchivedPlaylistQuery.objects.get_or_create(
                 playlist=archived_playlist, query=self.query
             )
+        song_utils.archive_changed()
 
         if storage.get("logging_enabled") and session_key:
             RequestLog.objects.create(
@@ -197,13 +197,11 @@ class PlaylistProvider(MusicProvider):
             )
 
     def enqueue(self) -> None:
-        for index, external_url in enumerate(self.urls):
-            if index == storage.get("max_playlist_items"):
-                break
-            # request every url in the playlist as their own url
+        # request every url in the playlist as their own song
+        song_providers: List[SongProvider] = []
+        for external_url in self.urls[: storage.get("max_playlist_items")]:
             try:
-                song_provider = SongProvider.create(external_url=external_url)
-                song_provider.request("", archive=False, manually_requested=False)
+                song_providers.append(SongProvider.create(external_url=external_url))
             except (ProviderError, NotImplementedError) as error:
                 logging.warning(
                     "Error while enqueuing url %s to playlist %s: %s",
@@ -212,9 +210,6 @@ class PlaylistProvider(MusicProvider):
                     self.id,
                 )
                 logging.exception(error)
-                continue
-
-            if settings.DEBUG:
-                # the sqlite database has problems if songs are pushed very fast
-                # while a new song is taken from the queue. Add a delay to mitigate.
-                time.sleep(1)
+        SongProvider.request_many(
+            song_providers, "", archive=False, manually_requested=False
+        )
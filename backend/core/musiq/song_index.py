@@ -0,0 +1,146 @@
+"""This module provides an in-memory trigram index over the archived songs.
+It is used for suggestions if SQLite was built without the FTS5 extension.
+SQLite has no similarity search, testing every song for every term is a full table scan.
+Instead, every process indexes the artist, title and queries of all songs on first use.
+Songs and queries added by any process are indexed before the next search.
+Changes to existing songs are only picked up when the index is rebuilt."""
+
+import threading
+from array import array
+from bisect import insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import connection
+
+from core import redis
+from core.models import ArchivedQuery, ArchivedSong
+
+# maps every trigram to the sorted ids of the songs containing it
+_postings: Dict[str, array] = {}
+# the lowercase artist, title and queries of every song, separated by newlines
+_texts: Dict[int, str] = {}
+# the largest ids that were indexed. Larger ids were added after the index was built
+_last_song_id = 0
+_last_query_id = 0
+# the archive generation when the index was last updated
+_generation: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _trigrams(text: str) -> Set[str]:
+    # terms of a query never contain whitespace, so neither do the indexed trigrams
+    return {
+        text[index : index + 3]
+        for index in range(len(text) - 2)
+        if not any(char.isspace() for char in text[index : index + 3])
+    }
+
+
+def _add_text(song_id: int, text: str) -> None:
+    text = text.lower()
+    existing = _texts.get(song_id)
+    if existing is None:
+        _texts[song_id] = text
+        new_trigrams = _trigrams(text)
+    else:
+        _texts[song_id] = existing + "\n" + text
+        new_trigrams = _trigrams(text) - _trigrams(existing)
+    for trigram in new_trigrams:
+        posting = _postings.setdefault(trigram, array("I"))
+        if not posting or posting[-1] < song_id:
+            posting.append(song_id)
+        else:
+            # queries can be added to old songs
+            insort(posting, song_id)
+
+
+def _catch_up() -> None:
+    global _last_song_id, _last_query_id, _generation
+    # read before the database, changes in the meantime cause another catch up
+    generation = redis.get("archive_generation")
+    if generation == _generation:
+        return
+    for song_id, artist, title in (
+        ArchivedSong.objects.filter(id__gt=_last_song_id)
+        .order_by("id")
+        .values_list("id", "artist", "title")
+        .iterator()
+    ):
+        _add_text(song_id, f"{artist}\n{title}")
+        _last_song_id = song_id
+    for query_id, song_id, query in (
+        ArchivedQuery.objects.filter(id__gt=_last_query_id)
+        .order_by("id")
+        .values_list("id", "song_id", "query")
+        .iterator()
+    ):
+        # queries of songs that are not indexed yet were added concurrently.
+        # They will be indexed with the next catch up
+        if song_id > _last_song_id:
+            return
+        _add_text(song_id, query)
+        _last_query_id = query_id
+    _generation = generation
+
+
+def start() -> None:
+    """Builds the index in the background so the first search does not have to wait."""
+    threading.Thread(target=_build, daemon=True).start()
+
+
+def _build() -> None:
+    with _lock:
+        _catch_up()
+    connection.close()
+
+
+def clear() -> None:
+    """Drops the index, it is rebuilt with the next search."""
+    global _last_song_id, _last_query_id, _generation
+    with _lock:
+        _postings.clear()
+        _texts.clear()
+        _last_song_id = 0
+        _last_query_id = 0
+        _generation = None
+
+
+def _score(text: str, terms: List[str]) -> float:
+    # Trigram similarity of a query and a matching field is roughly the ratio of their lengths.
+    # Prefer the shortest field (or artist and title) that contains all terms.
+    fields = text.split("\n")
+    fields.append(fields[0] + " " + fields[1])
+    matching = [field for field in fields if all(term in field for term in terms)]
+    best = min(matching, key=len) if matching else text
+    return sum(len(term) for term in terms) / len(best)
+
+
+def search(query: str, limit: int) -> List[Tuple[int, float]]:
+    """Returns the ids of at most :param limit: songs that contain every term of the query,
+    together with their similarity to the query, most similar first."""
+    terms = query.lower().split()
+    if not terms:
+        return []
+    with _lock:
+        _catch_up()
+        long_terms = [term for term in terms if len(term) >= 3]
+        if long_terms:
+            # only songs containing the rarest trigram need to be checked
+            candidates: Iterable[int] = min(
+                (
+                    _postings.get(term[index : index + 3], ())
+                    for term in long_terms
+                    for index in range(len(term) - 2)
+                ),
+                key=len,
+            )
+        else:
+            # terms shorter than a trigram require a scan over all songs
+            candidates = _texts.keys()
+        scored = [
+            (song_id, _score(_texts[song_id], terms))
+            for song_id in candidates
+            if all(term in _texts[song_id] for term in terms)
+        ]
+    scored.sort(key=lambda entry: entry[1], reverse=True)
+    return scored[:limit]
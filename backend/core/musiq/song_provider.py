@@ -1,7 +1,7 @@
 """This module contains the base class of all song providers."""
 import datetime
 import logging
-from typing import Optional, Type, List, Dict, Callable, Tuple
+from typing import Any, Optional, Type, List, Dict, Callable, Tuple
 
 from django.db import transaction
 from django.db.models.expressions import F
@@ -148,8 +148,55 @@ class SongProvider(MusicProvider):
         logging.error("Can not extract id because neither key nor query are known")
         return None
 
-    def enqueue_placeholder(self, manually_requested) -> None:
-        metadata: Metadata = {
+    @staticmethod
+    def request_many(
+        providers: List["SongProvider"],
+        session_key: str,
+        archive: bool = True,
+        manually_requested: bool = True,
+    ) -> None:
+        """Requests all given songs at once.
+        Their placeholders are inserted into the queue with a single write.
+        Songs that can not be requested are logged and skipped,
+        including the songs that exceed the maximum queue length."""
+        capacity = len(providers)
+        if storage.get("max_queue_length") > 0:
+            capacity = storage.get("max_queue_length") - playback.queue.count()
+
+        requests: List[Tuple[SongProvider, Any]] = []
+        for provider in providers:
+            try:
+                if len(requests) >= capacity:
+                    # the same error as in MusicProvider.request
+                    provider.error = "Queue limit reached"
+                    raise ProviderError(provider.error)
+                enqueue_function = provider.prepare_request()
+            except (ProviderError, NotImplementedError) as error:
+                logging.warning(
+                    "Error while requesting %s: %s", provider.query, provider.error
+                )
+                logging.exception(error)
+                continue
+            requests.append((provider, enqueue_function))
+        if not requests:
+            return
+
+        initial_votes = 1 if manually_requested else 0
+        queued_songs = playback.queue.enqueue_many(
+            [provider.placeholder_metadata() for provider, _ in requests],
+            manually_requested,
+            votes=initial_votes,
+            enqueue_first=storage.get("enqueue_first"),
+        )
+        musiq.update_state()
+
+        for (provider, enqueue_function), queued_song in zip(requests, queued_songs):
+            provider.queued_song = queued_song
+            enqueue_function.delay(provider, session_key, archive)
+
+    def placeholder_metadata(self) -> "Metadata":
+        """Returns the metadata of the placeholder representing this song in the queue."""
+        return {
             "artist": "",
             "title": self.query or self.get_external_url(),
             "duration": -1,
@@ -158,9 +205,11 @@ class SongProvider(MusicProvider):
             "stream_url": None,
             "cached": False,
         }
+
+    def enqueue_placeholder(self, manually_requested) -> None:
         initial_votes = 1 if manually_requested else 0
         self.queued_song = playback.queue.enqueue(
-            metadata,
+            self.placeholder_metadata(),
             manually_requested,
             votes=initial_votes,
             enqueue_first=storage.get("enqueue_first"),
@@ -301,6 +350,7 @@ class SongProvider(MusicProvider):
                 ArchivedQuery.objects.get_or_create(
                     song=archived_song, query=self.query
                 )
+            song_utils.archive_changed()
 
         if storage.get("logging_enabled") and session_key:
             RequestLog.objects.create(song=archived_song, session_key=session_key)
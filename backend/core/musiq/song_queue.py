@@ -3,17 +3,48 @@
 from __future__ import annotations
 
 import random
-from typing import TYPE_CHECKING, Optional, Tuple
+import sqlite3
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-from django.db import models, transaction
+from django.db import connection, models, transaction
 from django.db.models import F, QuerySet
 
 import core.models
+from core import redis
 
 if TYPE_CHECKING:
     from core.models import QueuedSong
     from core.musiq.song_utils import Metadata
 
+# The index of a queued song is a sparse ordering key.
+# Consecutive songs are SPACING apart, so moving, removing or dequeuing a song
+# only touches the row of that song instead of renumbering all following songs.
+# Clients never see these keys, they receive the (dense) position of each song.
+SPACING = 1 << 10
+# When a gap between two songs becomes smaller than this,
+# the playback loop rebalances the queue after the current song.
+MIN_GAP = SPACING >> 5
+# Rebalance before keys grow out of the range of the integer column.
+MAX_KEY = 1 << 30
+
+
+def _can_delete_returning() -> bool:
+    # postgres and SQLite 3.35+ can return the deleted rows
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return sqlite3.sqlite_version_info >= (3, 35)
+    return False
+
+
+def _can_update_from() -> bool:
+    # postgres and SQLite 3.33+ support UPDATE ... FROM
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return sqlite3.sqlite_version_info >= (3, 33)
+    return False
+
 
 class SongQueue(models.Manager):
     """This is the manager for the QueuedSong model.
@@ -40,7 +71,10 @@ class SongQueue(models.Manager):
     ) -> QueuedSong:
         """Creates a new song at the end of the queue and returns it."""
         last = self.last()
-        index = 1 if last is None else last.index + 1
+        index = SPACING if last is None else last.index + SPACING
+        if index > MAX_KEY:
+            self.rebalance()
+            index = self.count() * SPACING + SPACING
         song = self.create(
             index=index,
             votes=votes,
@@ -56,6 +90,62 @@ class SongQueue(models.Manager):
             self.prioritize(song.id)
         return song
 
+    @transaction.atomic
+    def enqueue_many(
+        self,
+        metadata_list: List["Metadata"],
+        manually_requested: bool,
+        votes=0,
+        enqueue_first=False,
+    ) -> List[QueuedSong]:
+        """Creates new songs at the end of the queue in the given order and returns them.
+        With :param enqueue_first: they are placed at the front of the queue instead,
+        in reverse order, as if every song was enqueued first on its own.
+        The songs are returned in the order of :param metadata_list:.
+        All songs are inserted with a single query."""
+        if not metadata_list:
+            return []
+        if enqueue_first:
+            first = self.first()
+            start = 0 if first is None else first.index - SPACING * len(metadata_list)
+            if start < -MAX_KEY:
+                self.rebalance()
+                start = -SPACING * len(metadata_list)
+        else:
+            last = self.last()
+            start = SPACING if last is None else last.index + SPACING
+            if start + SPACING * len(metadata_list) > MAX_KEY:
+                self.rebalance()
+                start = self.count() * SPACING + SPACING
+        indices = [start + SPACING * offset for offset in range(len(metadata_list))]
+        if enqueue_first:
+            # the last song ends up at the front
+            indices.reverse()
+        songs = self.bulk_create(
+            [
+                core.models.QueuedSong(
+                    index=index,
+                    votes=votes,
+                    manually_requested=manually_requested,
+                    artist=metadata["artist"],
+                    title=metadata["title"],
+                    duration=metadata["duration"],
+                    internal_url=metadata["internal_url"],
+                    external_url=metadata["external_url"],
+                    stream_url=metadata["stream_url"],
+                )
+                for index, metadata in zip(indices, metadata_list)
+            ]
+        )
+        if songs[0].id is None:
+            # older databases can not return the ids of bulk inserted rows
+            songs = list(
+                self.filter(index__gte=min(indices), index__lte=max(indices)).order_by(
+                    "-index" if enqueue_first else "index"
+                )
+            )
+        return songs
+
     @transaction.atomic
     def dequeue(self) -> Tuple[int, Optional["QueuedSong"]]:
         """Removes the first completed song from the queue and returns its id and the object."""
@@ -64,9 +154,31 @@ class SongQueue(models.Manager):
             return -1, None
         song_id = song.id
         song.delete()
-        self.filter(index__gt=song.index).update(index=F("index") - 1)
         return song_id, song
 
+    @transaction.atomic
+    def pop_highest_voted(self) -> Optional["QueuedSong"]:
+        """Removes the confirmed song with the most votes from the queue and returns it.
+        Songs with equal votes are taken in queue order."""
+        if not _can_delete_returning():
+            # DELETE ... RETURNING is not supported, select and delete separately
+            song = self.confirmed().order_by("-votes", "index").first()
+            if song is not None:
+                song.delete()
+            return song
+
+        # Select and delete the song in one statement, using the partial index on confirmed songs.
+        # Concurrent changes to the highest voted song are waited for instead of skipping it.
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        index = connection.ops.quote_name("index")
+        lock = " FOR UPDATE" if connection.vendor == "postgresql" else ""
+        popped = self.raw(
+            f"DELETE FROM {table} WHERE id = ("
+            f"SELECT id FROM {table} WHERE internal_url IS NOT NULL "
+            f"ORDER BY votes DESC, {index} LIMIT 1{lock}) RETURNING *"
+        )
+        return next(iter(popped), None)
+
     @transaction.atomic
     def prioritize(self, key: int) -> None:
         """Moves the song specified by :param key: to the front of the queue."""
@@ -75,9 +187,12 @@ class SongQueue(models.Manager):
         if to_prioritize == first:
             return
 
-        self.filter(index__lt=to_prioritize.index).update(index=F("index") + 1)
-        to_prioritize.index = 1
-        to_prioritize.save()
+        assert first
+        if first.index - SPACING < -MAX_KEY:
+            self.rebalance()
+            first.refresh_from_db()
+        to_prioritize.index = first.index - SPACING
+        to_prioritize.save(update_fields=["index"])
 
     @transaction.atomic
     def deprioritize(self, key: int) -> None:
@@ -87,16 +202,15 @@ class SongQueue(models.Manager):
         if to_deprioritize == last:
             return
 
-        self.filter(index__gt=to_deprioritize.index).update(index=F("index") - 1)
-        to_deprioritize.index = self.count()
-        to_deprioritize.save()
+        assert last
+        to_deprioritize.index = last.index + SPACING
+        to_deprioritize.save(update_fields=["index"])
 
     @transaction.atomic
     def remove(self, key: int) -> "QueuedSong":
         """Removes the song specified by :param key: from the queue and returns it."""
         to_remove = self.get(id=key)
         to_remove.delete()
-        self.filter(index__gt=to_remove.index).update(index=F("index") - 1)
         return to_remove
 
     @transaction.atomic
@@ -137,37 +251,60 @@ class SongQueue(models.Manager):
             return
         # neither new_prev and new_next are None
         # new_prev and new_next have to be adjacent
-        if new_next.index != new_prev.index + 1:
+        if new_next.index <= new_prev.index or (
+            self.filter(index__gt=new_prev.index, index__lt=new_next.index).exists()
+        ):
             raise ValueError("given pair of songs is not adjacent")
 
-        # update indices
-        moving_up = True
-        if new_prev.index > to_reorder.index or new_next.index > to_reorder.index:
-            moving_up = False
-
-        to_update = self.all()
-        if moving_up:
-            new_index = new_next.index
-            to_update = to_update.filter(index__lte=to_reorder.index - 1)
-            to_update = to_update.filter(index__gte=new_next.index)
-            to_update.update(index=F("index") + 1)
-        else:
-            new_index = new_prev.index
-            to_update = to_update.filter(index__lte=new_prev.index)
-            to_update = to_update.filter(index__gte=to_reorder.index + 1)
-            to_update.update(index=F("index") - 1)
+        if new_next.index - new_prev.index < 2:
+            # there is no free key between the two songs, make room first
+            self.rebalance()
+            new_prev.refresh_from_db()
+            new_next.refresh_from_db()
 
+        new_index = (new_prev.index + new_next.index) // 2
         to_reorder.index = new_index
-        to_reorder.save()
+        to_reorder.save(update_fields=["index"])
+
+        if min(new_index - new_prev.index, new_next.index - new_index) < MIN_GAP:
+            redis.put("queue_rebalance_requested", True)
 
     @transaction.atomic
     def shuffle(self) -> None:
         """Assigns a random index to every song in the queue."""
-        indices = list(range(1, self.count() + 1))
-        random.shuffle(indices)
-        for song, index in zip(self.all(), indices):
-            song.index = index
-            song.save()
+        if not _can_update_from():
+            # fall back to a batched update
+            songs = list(self.select_for_update().only("id", "index"))
+            indices = [position * SPACING for position in range(1, len(songs) + 1)]
+            random.shuffle(indices)
+            for song, index in zip(songs, indices):
+                song.index = index
+            self.bulk_update(songs, ["index"], batch_size=100)
+            return
+
+        # Reassign all keys with a single statement.
+        # Songs are numbered in random order and spaced like in a rebalanced queue.
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        index = connection.ops.quote_name("index")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {index} = shuffled.position * %s "
+                f"FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY RANDOM()) AS position "
+                f"FROM {table}) AS shuffled "
+                f"WHERE {table}.id = shuffled.id",
+                [SPACING],
+            )
+
+    @transaction.atomic
+    def rebalance(self) -> None:
+        """Spreads the keys of all songs evenly, keeping their order."""
+        songs = self.select_for_update().order_by("index", "id")
+        changed = []
+        for position, song in enumerate(songs, start=1):
+            if song.index != position * SPACING:
+                song.index = position * SPACING
+                changed.append(song)
+        self.bulk_update(changed, ["index"])
 
     @transaction.atomic
     def vote(self, key: int, amount: int, threshold: int) -> Optional["QueuedSong"]:
@@ -2,10 +2,13 @@
 
 import os
 import re
-from typing import TYPE_CHECKING, Optional, TypedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Pattern, Tuple, TypedDict
 
 import mutagen.easymp4
+from django.db import transaction
 
+from core import redis
 from core.settings import storage
 from django.conf import settings as conf
 
@@ -33,6 +36,12 @@ def get_path(basename: str) -> str:
     return path
 
 
+def archive_changed() -> None:
+    """Marks the archived songs and playlists as changed once the transaction is committed.
+    Derived data, like the suggestion index, is updated on its next use."""
+    transaction.on_commit(lambda: redis.increment("archive_generation"))
+
+
 def determine_url_type(url: str) -> str:
     """Returns the service the given url corresponds to."""
     if url.startswith("local_library/"):
@@ -64,6 +73,23 @@ def determine_playlist_type(archived_playlist: "ArchivedPlaylist") -> str:
     return determine_url_type(first_song_url)
 
 
+def update_playlist_entries_info(archived_playlist: "ArchivedPlaylist") -> None:
+    """Stores the platform of the playlist and whether its first song is cached.
+    Needs to be called whenever the entries of the playlist change."""
+    from core.models import ArchivedSong
+
+    first_entry = archived_playlist.entries.first()
+    try:
+        archived_playlist.platform = determine_playlist_type(archived_playlist)
+    except ValueError:
+        archived_playlist.platform = ""
+    archived_playlist.first_entry_cached = (
+        first_entry is not None
+        and ArchivedSong.objects.filter(url=first_entry.url, cached=True).exists()
+    )
+    archived_playlist.save(update_fields=["platform", "first_entry_cached"])
+
+
 def format_seconds(seconds: int) -> str:
     """Takes seconds and formats them as [hh:]mm:ss."""
 
@@ -114,16 +140,21 @@ def get_metadata(path: str) -> "Metadata":
     return metadata
 
 
-def is_forbidden(string: str) -> bool:
-    """Returns whether the given string should be filtered according to the forbidden keywords."""
-    # We can't access the variable in settings/basic.py
-    # since we are in a static context without a reference to bes
-    keywords = storage.get("forbidden_keywords")
+@lru_cache(maxsize=8)
+def _forbidden_patterns(keywords: str) -> Tuple[Pattern[str], ...]:
+    # Every keyword is a regular expression, compiled only once for every set of keywords.
+    # They are not combined into a single pattern, which would renumber their groups.
     words = re.split(r"[,\s]+", keywords.strip())
     # delete empty matches
     words = [word for word in words if word]
+    return tuple(re.compile(word, re.IGNORECASE) for word in words)
+
 
-    for word in words:
-        if re.search(word, string, re.IGNORECASE):
-            return True
-    return False
+def is_forbidden(string: str, keywords: Optional[str] = None) -> bool:
+    """Returns whether the given string should be filtered according to the forbidden keywords.
+    Uses the keywords from the settings unless :param keywords: is given."""
+    if keywords is None:
+        # We can't access the variable in settings/basic.py
+        # since we are in a static context without a reference to bes
+        keywords = storage.get("forbidden_keywords")
+    return any(pattern.search(string) for pattern in _forbidden_patterns(keywords))
@@ -126,9 +126,12 @@ class SoundcloudSongProvider(SongProvider, Soundcloud):
     def request_radio(self, session_key: str) -> HttpResponse:
         urls = self._get_related_urls()
 
-        for external_url in urls:
-            provider = SoundcloudSongProvider(external_url, None)
-            provider.request("", archive=False, manually_requested=False)
+        providers: List[SongProvider] = [
+            SoundcloudSongProvider(external_url, None) for external_url in urls
+        ]
+        SongProvider.request_many(
+            providers, "", archive=False, manually_requested=False
+        )
 
         return HttpResponse("queueing radio")
 
@@ -219,10 +219,13 @@ class SpotifySongProvider(SongProvider, Spotify):
             limit=storage.get("max_playlist_items"), seed_tracks=[self.id]
         )
 
-        for track in result["tracks"]:
-            external_url = track["external_urls"]["spotify"]
-            provider = SpotifySongProvider(external_url, None)
-            provider.request("", archive=False, manually_requested=False)
+        providers: List[SongProvider] = [
+            SpotifySongProvider(track["external_urls"]["spotify"], None)
+            for track in result["tracks"]
+        ]
+        SongProvider.request_many(
+            providers, "", archive=False, manually_requested=False
+        )
 
         return HttpResponse("queueing radio")
 
@@ -5,9 +5,13 @@ from __future__ import annotations
 
 import random
 import threading
-from typing import Any, Dict, Iterable, List, Mapping, TypedDict, Union, cast
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Tuple, TypedDict, Union, cast
+
+import cachetools
 
 from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection
 from django.db.models import F, Q
 from django.db.models.functions import Greatest
 from django.http import HttpResponseBadRequest
@@ -15,10 +19,9 @@ from django.http.response import HttpResponse, JsonResponse
 
 from core import redis
 from core.models import ArchivedPlaylist, ArchivedQuery, ArchivedSong
-from core.musiq import song_utils
+from core.musiq import song_index, song_utils
 from core.settings import storage
 from core.settings.storage import PlatformEnabled, PlatformSuggestions
-from main import settings
 
 u_values_list = [
     "u_id",
@@ -30,6 +33,18 @@ u_values_list = [
     "u_cached",
 ]
 
+# Type-ahead sends a request for every keystroke, and many guests type the same artists.
+# Offline suggestions are cached in every process until the archive changes.
+SUGGESTION_CACHE_SIZE = 1000
+# changes that are not signaled, e.g. from the admin interface, are visible after this time
+SUGGESTION_CACHE_TTL = 60
+_suggestion_cache: cachetools.TTLCache = cachetools.TTLCache(
+    SUGGESTION_CACHE_SIZE, SUGGESTION_CACHE_TTL
+)
+# the archive generation of the cached suggestions
+_suggestion_cache_generation = None
+_suggestion_cache_lock = threading.Lock()
+
 
 class SuggestionResult(TypedDict, total=False):
     """Type that encapsulates a suggestion for a query."""
@@ -161,7 +176,8 @@ def online_suggestions(request: WSGIRequest) -> JsonResponse:
     return JsonResponse(results, safe=False)
 
 
-def _offline_playlist_suggestions(query: str) -> List[SuggestionResult]:
+def _offline_playlist_suggestions(query: str) -> Tuple[List[SuggestionResult], bool]:
+    # Returns the suggestions for the query and whether all matching playlists were considered
     results: List[SuggestionResult] = []
     terms = query.split()
     remaining_playlists = ArchivedPlaylist.objects.prefetch_related("queries")
@@ -174,16 +190,16 @@ def _offline_playlist_suggestions(query: str) -> List[SuggestionResult]:
     # but massaging both QuerySets into a single Type would require asserts/casts,
     # which have little performance impact but should be avoided in this critical codepath
     playlist_results: Iterable[Mapping[str, Any]]
-    if settings.DEBUG:
+    if connection.vendor != "postgresql":
         matching_playlists = remaining_playlists
         for term in terms:
             matching_playlists = matching_playlists.filter(
                 Q(title__icontains=term) | Q(queries__query__icontains=term)
             )
 
-        playlist_results = (
+        playlist_results = list(
             matching_playlists.order_by("-counter")
-            .values("id", "title", "counter")
+            .values("id", "title", "counter", "platform", "first_entry_cached")
             .distinct()[: storage.get("number_of_suggestions")]
         )
     else:
@@ -195,37 +211,33 @@ def _offline_playlist_suggestions(query: str) -> List[SuggestionResult]:
             max_similarity=Greatest("title_similarity", "query_similarity"),
         )
 
-        playlist_results = (
+        playlist_results = list(
             similar_playlists.order_by("-max_similarity")
-            .values("id", "title", "counter")
+            .values("id", "title", "counter", "platform", "first_entry_cached")
             .distinct()[: storage.get("number_of_suggestions")]
         )
     for playlist in playlist_results:
-        archived_playlist = ArchivedPlaylist.objects.get(id=playlist["id"])
-        platform = song_utils.determine_playlist_type(archived_playlist)
+        platform = playlist["platform"]
         result_dict: SuggestionResult = {
             "key": playlist["id"],
             "value": playlist["title"],
             "counter": playlist["counter"],
             "type": platform,
         }
-        first_entry = archived_playlist.entries.first()
-        if first_entry and platform == "local":
+        if platform == "local":
             # don't suggest local playlists if their first song is not cached
             # i.e. not at the expected location
-            try:
-                first_song = ArchivedSong.objects.filter(url=first_entry.url).get()
-                if not first_song.cached:
-                    continue
-            except ArchivedSong.DoesNotExist:
+            if not playlist["first_entry_cached"]:
                 continue
-        else:
+        elif platform in ["youtube", "spotify", "soundcloud", "jamendo"]:
             # don't suggest songs if the respective platform is disabled
-            assert platform in ["youtube", "spotify", "soundcloud", "jamendo"]
             if not storage.get(cast(PlatformEnabled, f"{platform}_enabled")):
                 continue
+        elif platform != "playlog":
+            # the playlist contains no songs
+            continue
         results.append(result_dict)
-    return results
+    return results, len(playlist_results) < storage.get("number_of_suggestions")
 
 
 def _postgres_song_results(query: str) -> List[Dict[str, Union[int, str, float]]]:
@@ -253,6 +265,7 @@ def _postgres_song_results(query: str) -> List[Dict[str, Union[int, str, float]]
 
     similar_queries = (
         ArchivedQuery.objects.filter(Q(query__trigram_word_similar=query))
+        .filter(song__forbidden=False)
         .annotate(u_id=F("song__id"))
         .annotate(u_url=F("song__url"))
         .annotate(u_artist=F("song__artist"))
@@ -276,6 +289,7 @@ def _postgres_song_results(query: str) -> List[Dict[str, Union[int, str, float]]
         ArchivedSong.objects.filter(
             Q(artist__trigram_word_similar=query) | Q(title__trigram_word_similar=query)
         )
+        .filter(forbidden=False)
         .annotate(u_id=F("id"))
         .annotate(u_url=F("url"))
         .annotate(u_artist=F("artist"))
@@ -335,60 +349,82 @@ def _postgres_song_results(query: str) -> List[Dict[str, Union[int, str, float]]
     return song_results
 
 
-def _offline_song_suggestions(query: str) -> List[SuggestionResult]:
-    results: List[SuggestionResult] = []
-    terms = query.split()
-    song_results: Iterable[Mapping[str, Any]]
-    if settings.DEBUG:
-        # Testing the whole table whether it contains any term is quite costly.
-        # Used for sqlite3 which does not have a similarity function.
-        matching_songs = ArchivedSong.objects.prefetch_related("queries")
-        for term in terms:
-            matching_songs = matching_songs.filter(
-                Q(title__icontains=term)
-                | Q(artist__icontains=term)
-                | Q(queries__query__icontains=term)
-            )
-
-        song_results = (
-            matching_songs.order_by("-counter")
-            # annotate with same values as in the postgres case to have a consistent interface
-            .annotate(
-                u_id=F("id"),
-                u_url=F("url"),
-                u_artist=F("artist"),
-                u_title=F("title"),
-                u_duration=F("duration"),
-                u_counter=F("counter"),
-                u_cached=F("cached"),
-            )
-            .values(*u_values_list)
-            .distinct()[: storage.get("number_of_suggestions")]
+@lru_cache(maxsize=None)
+def _fts_available() -> bool:
+    # the full text index is only created if the SQLite build supports it
+    return "core_archivedsong_fts" in connection.introspection.table_names()
+
+
+def start() -> None:
+    """Prepares the song search of this process."""
+    if connection.vendor == "sqlite" and not _fts_available():
+        song_index.start()
+
+
+def _fts_song_results(query: str) -> List[Dict[str, Union[int, str, float]]]:
+    # every term is quoted so it can not be interpreted as an operator,
+    # and matches all words starting with it
+    terms = ['"' + term.replace('"', '""') + '"*' for term in query.split()]
+    if not terms:
+        return []
+    with connection.cursor() as cursor:
+        # bm25 is lower for better matches.
+        # Matches in artist and title are weighted higher than in queries
+        cursor.execute(
+            """
+            SELECT song.id, song.url, song.artist, song.title,
+                song.duration, song.counter, song.cached
+            FROM core_archivedsong_fts
+            JOIN core_archivedsong song ON song.id = core_archivedsong_fts.rowid
+            WHERE core_archivedsong_fts MATCH %s AND NOT song.forbidden
+            ORDER BY bm25(core_archivedsong_fts, 2.0, 2.0, 1.0), song.counter DESC
+            LIMIT %s
+            """,
+            [" ".join(terms), storage.get("number_of_suggestions")],
         )
+        return [dict(zip(u_values_list, row)) for row in cursor.fetchall()]
 
-        # Perhaps this could be combined with the similarity search
-        # to improve usability with the right weighting.
-        # matching_songs = matching_songs.annotate(
-        #    artist_similarity=Coalesce(TrigramWordSimilarity(query, "artist"), 0),
-        #    title_similarity=Coalesce(TrigramWordSimilarity(query, "title"), 0),
-        #    query_similarity=Coalesce(TrigramWordSimilarity(query, "queries__query"), 0),
-        #    max_similarity=Greatest(
-        #        "artist_similarity", "title_similarity", "query_similarity"
-        #    ),
-        # )
-
-        # To combine, use union instead of | (or) in order to access the annotated values
-        # similar_songs = union(matching_songs)
-    else:
+
+def _indexed_song_results(query: str) -> List[Dict[str, Union[int, str, float]]]:
+    number_of_suggestions = storage.get("number_of_suggestions")
+    # Songs with equal similarity are ordered by their counter, which is not indexed.
+    # Fetch more songs than needed so popular songs are not cut off.
+    similarities = dict(song_index.search(query, 4 * number_of_suggestions))
+    song_results = list(
+        ArchivedSong.objects.filter(id__in=similarities, forbidden=False)
+        # annotate with same values as in the postgres case to have a consistent interface
+        .annotate(
+            u_id=F("id"),
+            u_url=F("url"),
+            u_artist=F("artist"),
+            u_title=F("title"),
+            u_duration=F("duration"),
+            u_counter=F("counter"),
+            u_cached=F("cached"),
+        ).values(*u_values_list)
+    )
+    song_results.sort(
+        key=lambda song: (-similarities[song["u_id"]], -song["u_counter"])
+    )
+    return song_results[:number_of_suggestions]
+
+
+def _offline_song_suggestions(query: str) -> Tuple[List[SuggestionResult], bool]:
+    # Returns the suggestions for the query and whether all matching songs were considered
+    results: List[SuggestionResult] = []
+    song_results: List[Dict[str, Union[int, str, float]]]
+    if connection.vendor == "postgresql":
         song_results = _postgres_song_results(query)
+    elif _fts_available():
+        song_results = _fts_song_results(query)
+    else:
+        # sqlite3 does not have a similarity function.
+        # Testing the whole table whether it contains any term is quite costly,
+        # so matching songs are found with an in-memory index instead.
+        song_results = _indexed_song_results(query)
 
     has_internet = redis.get("has_internet")
     for song in song_results:
-        if song_utils.is_forbidden(song["u_artist"]) or song_utils.is_forbidden(
-            song["u_title"]
-        ):
-            continue
-
         platform = song_utils.determine_url_type(song["u_url"])
         # don't suggest online songs when we don't have internet
         if not has_internet and not song["u_cached"]:
@@ -417,7 +453,80 @@ def _offline_song_suggestions(query: str) -> List[SuggestionResult]:
             result["confusable"] = True
             results[seen_values[result["value"]]]["confusable"] = True
         seen_values[result["value"]] = index
-    return results
+    return results, len(song_results) < storage.get("number_of_suggestions")
+
+
+def _suggestion_fingerprint() -> Tuple[Any, ...]:
+    # all settings that determine which of the matching songs are suggested
+    return (
+        *storage.get_many(
+            [
+                "youtube_enabled",
+                "spotify_enabled",
+                "soundcloud_enabled",
+                "jamendo_enabled",
+                "forbidden_keywords",
+                "number_of_suggestions",
+            ]
+        ),
+        redis.get("has_internet"),
+    )
+
+
+def _refine_cached(query: str, suggest_playlist: bool, fingerprint: Tuple) -> bool:
+    # Returns whether a shorter query is cached that had no suggestions, although
+    # all of its matches were considered. The matches of an extended query are a subset,
+    # so it has no suggestions either.
+    # This does not hold for the trigram similarity used with postgres.
+    if connection.vendor == "postgresql":
+        return False
+    for end in range(len(query) - 1, 0, -1):
+        cached = _suggestion_cache.get((query[:end], suggest_playlist, fingerprint))
+        if cached is not None and not cached[0] and cached[1]:
+            return True
+    return False
+
+
+def _cached_offline_suggestions(
+    query: str, suggest_playlist: bool
+) -> List[SuggestionResult]:
+    global _suggestion_cache_generation
+    # all backends ignore case and whitespace
+    query = " ".join(query.lower().split())
+    key = (query, suggest_playlist, _suggestion_fingerprint())
+    generation = redis.get("archive_generation")
+    with _suggestion_cache_lock:
+        if generation != _suggestion_cache_generation:
+            _suggestion_cache.clear()
+            _suggestion_cache_generation = generation
+        cached = _suggestion_cache.get(key)
+        if cached is None and _refine_cached(*key):
+            cached = ([], True)
+    redis.connection.hincrby("suggestion_cache", "misses" if cached is None else "hits")
+    if cached is not None:
+        return cached[0]
+
+    if suggest_playlist:
+        cached = _offline_playlist_suggestions(query)
+    else:
+        cached = _offline_song_suggestions(query)
+    with _suggestion_cache_lock:
+        # do not cache results that might predate a change of the archive
+        if generation == _suggestion_cache_generation:
+            _suggestion_cache[key] = cached
+    return cached[0]
+
+
+def suggestion_cache_counters() -> Dict[str, Union[int, float]]:
+    """Returns how many offline suggestions were served from the cache."""
+    counters = redis.connection.hgetall("suggestion_cache")
+    hits = int(counters.get("hits", 0))
+    misses = int(counters.get("misses", 0))
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hitRate": hits / (hits + misses) if hits + misses else 0.0,
+    }
 
 
 def offline_suggestions(request: WSGIRequest) -> JsonResponse:
@@ -428,9 +537,6 @@ def offline_suggestions(request: WSGIRequest) -> JsonResponse:
     if storage.get("new_music_only"):
         return JsonResponse([], safe=False)
 
-    if suggest_playlist:
-        results = _offline_playlist_suggestions(query)
-    else:
-        results = _offline_song_suggestions(query)
-
-    return JsonResponse(results, safe=False)
+    return JsonResponse(
+        _cached_offline_suggestions(query, suggest_playlist), safe=False
+    )
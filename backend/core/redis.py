@@ -1,11 +1,15 @@
 """This module provides functionality to interface with Redis."""
-from ast import literal_eval
-from typing import Any, Dict, List, Optional, Tuple, Union, Literal
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union, Literal
 
 from django.conf import settings as conf
 from redis import Redis
-
-from core.util import strtobool
+from redis.client import Pipeline
+from redis.exceptions import ConnectionError as RedisConnectionError
 
 # locks:
 # mopidy_lock:  controlling mopidy api accesses
@@ -13,11 +17,36 @@ from core.util import strtobool
 
 # channels
 # lights_settings_changed
+# mirrored_changed:  the mirrored keys that were written, "*" if all of them changed
+
+# hashes
+# vote_deltas:  votes per song that were not yet written to the database
+# engagement-<queue_key>:  the requester and the vote of each session for a song
+# ip_votes-<queue_key>:  the vote of each ip for a song, used for ip checking
+# suggestion_cache:  hits and misses of the suggestion cache, see core.musiq.suggestions
+
+# sorted sets
+# active_users: the ip of every client, scored by the time of its last request
+
+# events
+# queue_changed, buzzer_stopped:  the flag of the event, see Event
+# queue_changed_stream, buzzer_stopped_stream:  one entry per set of the event
+
+# next_color_index: the index of the next color assigned to a session, see core.user_manager
+# sessions_active: exists as long as the most recently created session, see core.user_manager
+# visitors: the number of page views, written to the database periodically, see core.base
+
+# leader: the id of the worker process running the background loops, see core.leader
+# asgi*: groups and messages of the channel layer
+# sessions:*: the sessions of clients, if they are stored in redis (DJANGO_CACHED_SESSIONS)
+# these are shared with the other worker processes and survive start()
 
 DeviceInitialized = Literal
 
 # values:
 # maps key to default and type of value
+# dicts are stored as hashes, lists as lists and sets as sets,
+# all other values are stored in plain keys. Every value is encoded as json.
 defaults = {
     # playback
     "active_player": "fake",
@@ -30,6 +59,7 @@ defaults = {
     "alarm_duration": 10.0,
     "last_buzzer": 0.0,
     "backup_playing": False,
+    "queue_rebalance_requested": False,
     # lights
     "lights_active": False,
     "ring_initialized": False,
@@ -54,66 +84,299 @@ defaults = {
     # user manager
     "active_requests": 0,
     "last_user_count_update": 0.0,
-    "last_requests": {},
+    # suggestions
+    "archive_generation": 0,
 }
 
 connection = Redis(host=conf.REDIS_HOST, port=conf.REDIS_PORT, decode_responses=True)
 
+# Flags that are read in loops or many times per request, but rarely written.
+# Every process mirrors them in memory to avoid a network round-trip per read.
+# Writes are broadcast through redis, and every process drops the written keys from its mirror.
+# Only scalar values without expiry can be mirrored.
+MIRRORED_KEYS = {
+    "active_player",
+    "playing",
+    "paused",
+    "stop_playback_loop",
+    "alarm_playing",
+    "alarm_requested",
+    "backup_playing",
+    "has_internet",
+    "mopidy_available",
+    "youtube_available",
+    "spotify_available",
+    "soundcloud_available",
+    "jamendo_available",
+    "archive_generation",
+}
+mirror: Dict[str, Any] = {}
+
+# the pages whose serialized states are cached, see core.state_handler
+STATE_PAGES = ("base", "musiq", "lights", "settings")
+# The pages whose states contain each key, the base state is part of every page.
+# Writing one of these keys starts a new generation of the states of these pages,
+# so their cached states are recomputed even if no update is requested.
+STATE_KEYS: Dict[str, Tuple[str, ...]] = {
+    "playback_error": STATE_PAGES,
+    "alarm_playing": STATE_PAGES,
+    "lights_active": STATE_PAGES,
+    "backup_playing": ("musiq",),
+    "ring_initialized": ("lights",),
+    "wled_initialized": ("lights",),
+    "strip_initialized": ("lights",),
+    "screen_initialized": ("lights",),
+    "current_resolution": ("lights",),
+    "current_fps": ("lights",),
+    "has_internet": ("settings",),
+    "youtube_available": ("settings",),
+    "spotify_available": ("settings",),
+    "soundcloud_available": ("settings",),
+    "jamendo_available": ("settings",),
+    "library_scan_progress": ("settings",),
+    "bluetoothctl_active": ("settings",),
+    "bluetooth_devices": ("settings",),
+}
+# increased whenever mirrored keys are dropped.
+# Values read from redis are only mirrored if no write happened during the read
+_mirror_generation = 0
+# the process that is listening for changes, forked processes need their own listener
+_listener_pid: Optional[int] = None
+_listener_lock = threading.Lock()
+
+
+# prefixes of keys that are shared with the other worker processes
+_SHARED_PREFIXES = ("leader", "workers:", "asgi", "sessions:")
+
 
 def start() -> None:
-    """Initializes the module by clearing all keys."""
-    connection.flushdb()
+    """Initializes the module by clearing all keys.
+    Keys shared with the other worker processes are kept,
+    as these processes might already be serving clients."""
+    with connection.pipeline() as pipe:
+        for key in connection.scan_iter(count=1000):
+            if not key.startswith(_SHARED_PREFIXES):
+                pipe.delete(key)
+        # generations must not repeat after a restart,
+        # state generations are used as ETags and processes compare archive generations
+        for page in STATE_PAGES:
+            pipe.set(f"{page}_state_generation", int(time.time()))
+        pipe.set("archive_generation", int(time.time()))
+        pipe.publish("mirrored_changed", "*")
+        pipe.execute()
+    _drop_mirrored(MIRRORED_KEYS)
 
 
-def get(key: str) -> Union[bool, int, float, str, List, Dict, Tuple]:
-    """This method returns the value for the given :param key: from redis.
-    Vaules of non-existing keys are set to their respective default value."""
-    # values are stored as string in redis
-    # cast the value to its respective type, defined by the default value, before returning it
+def _drop_mirrored(keys: Iterable[str]) -> None:
+    global _mirror_generation
+    _mirror_generation += 1
+    for key in keys:
+        mirror.pop(key, None)
+
+
+def _listen(pubsub) -> None:
+    while True:
+        try:
+            for message in pubsub.listen():
+                if message["data"] == "*":
+                    _drop_mirrored(MIRRORED_KEYS)
+                else:
+                    _drop_mirrored(json.loads(message["data"]))
+        except RedisConnectionError:
+            logging.warning("lost connection to redis, resubscribing to mirrored keys")
+            time.sleep(1)
+            # changes might have been missed in the meantime
+            _drop_mirrored(MIRRORED_KEYS)
+
+
+def _ensure_listener() -> None:
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        # the mirror might have been inherited from the parent process
+        _drop_mirrored(MIRRORED_KEYS)
+        pubsub = connection.pubsub(ignore_subscribe_messages=True)
+        # subscribe before anything is mirrored so no change is missed
+        pubsub.subscribe("mirrored_changed")
+        threading.Thread(target=_listen, args=(pubsub,), daemon=True).start()
+        _listener_pid = os.getpid()
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value)
+
+
+def _decode(value: str) -> Any:
+    decoded = json.loads(value)
+    # json has no tuples. Values inside of containers are either scalars or tuples
+    if isinstance(decoded, list):
+        return tuple(decoded)
+    return decoded
+
+
+def _queue_get(pipe: Pipeline, key: str) -> None:
+    default = defaults[key]
+    if isinstance(default, dict):
+        pipe.hgetall(key)
+    elif isinstance(default, list):
+        pipe.lrange(key, 0, -1)
+    elif isinstance(default, set):
+        pipe.smembers(key)
+    else:
+        pipe.get(key)
+
+
+def _parse(key: str, value: Any) -> Any:
+    # converts the raw result of _queue_get into the type of the key's default value
     default = defaults[key]
-    value = connection.get(key)
+    if isinstance(default, (dict, list, set)):
+        # redis does not store empty containers, treat them like missing keys
+        if not value:
+            return type(default)(default)
+        if isinstance(default, dict):
+            return {field: _decode(entry) for field, entry in value.items()}
+        return type(default)(_decode(entry) for entry in value)
     if value is None:
         return default
-    if type(default) is bool:
-        return strtobool(value)
-    if type(default) in (list, dict, tuple):
-        # evaluate the stored literal
-        return literal_eval(value)
-    return type(default)(value)
+    return type(default)(json.loads(value))
+
+
+def _queue_put(pipe: Pipeline, key: str, value: Any, expire: Optional[float]) -> None:
+    default = defaults[key]
+    if not isinstance(default, (dict, list, set)):
+        pipe.set(key, _encode(value), ex=expire)
+        return
+    pipe.delete(key)
+    if not value:
+        return
+    if isinstance(default, dict):
+        pipe.hset(
+            key, mapping={field: _encode(entry) for field, entry in value.items()}
+        )
+    elif isinstance(default, list):
+        pipe.rpush(key, *(_encode(entry) for entry in value))
+    else:
+        pipe.sadd(key, *(_encode(entry) for entry in value))
+    if expire is not None:
+        pipe.expire(key, expire)
+
+
+def get(key: str) -> Union[bool, int, float, str, List, Dict, Tuple]:
+    """This method returns the value for the given :param key: from redis.
+    Vaules of non-existing keys are set to their respective default value."""
+    return get_many([key])[0]
+
+
+def get_many(keys: Iterable[str]) -> List[Any]:
+    """Returns the values for all given keys, fetched with a single round-trip.
+    Mirrored keys are read from memory if possible."""
+    _ensure_listener()
+    keys = list(keys)
+    values: Dict[str, Any] = {key: mirror[key] for key in keys if key in mirror}
+    missing = [key for key in keys if key not in values]
+    if missing:
+        generation = _mirror_generation
+        with connection.pipeline(transaction=False) as pipe:
+            for key in missing:
+                _queue_get(pipe, key)
+            fetched = pipe.execute()
+        for key, value in zip(missing, fetched):
+            values[key] = _parse(key, value)
+            if key in MIRRORED_KEYS and generation == _mirror_generation:
+                mirror[key] = values[key]
+    return [values[key] for key in keys]
 
 
 def put(key: str, value: Any, expire: Optional[float] = None) -> None:
     """This method sets the value for the given :param key: to the given :param value:.
     If set, the key will expire after :param ex: seconds."""
-    connection.set(key, str(value), ex=expire)
+    put_many({key: value}, expire=expire)
+
+
+def put_many(values: Dict[str, Any], expire: Optional[float] = None) -> None:
+    """Sets all given keys to their values atomically with a single round-trip."""
+    changed = [key for key in values if key in MIRRORED_KEYS]
+    assert expire is None or not changed, "mirrored keys can not expire"
+    outdated = {page for key in values for page in STATE_KEYS.get(key, ())}
+    with connection.pipeline() as pipe:
+        for key, value in values.items():
+            _queue_put(pipe, key, value, expire)
+        for page in outdated:
+            pipe.incr(f"{page}_state_generation")
+        if changed:
+            # published in the same transaction, so the new values are visible to all receivers
+            pipe.publish("mirrored_changed", json.dumps(changed))
+        pipe.execute()
+    if changed:
+        _drop_mirrored(changed)
+
+
+def increment(key: str) -> int:
+    """Atomically increments the integer value of the given :param key: and returns it."""
+    with connection.pipeline() as pipe:
+        pipe.incr(key)
+        if key in MIRRORED_KEYS:
+            pipe.publish("mirrored_changed", json.dumps([key]))
+        value = pipe.execute()[0]
+    if key in MIRRORED_KEYS:
+        _drop_mirrored([key])
+    return value
+
+
+# seconds a single blocking read of an Event may take.
+# redis-py closes reads that take longer than the socket timeout (5 seconds by default)
+EVENT_WAIT_SLICE = 1.0
 
 
 class Event:
-    """A class that provides basic functionality similar to threading.Event using redis."""
+    """A class that provides functionality similar to threading.Event using redis.
+    The flag is stored in redis, so it is shared by all processes.
+    Additionally, every set is appended to a stream that waiters block on.
+    Waiters read the stream from the last entry that existed when they checked the flag,
+    so a set happening in between is not missed."""
 
     def __init__(self, name: str) -> None:
         self.name = name
-        self.is_set = False
-        self.lock = connection.lock(f"{self.name}_lock")
+        self.stream = f"{name}_stream"
 
-    def wait(self) -> None:
-        """Blocks until the event is set."""
-        with self.lock:
-            is_set = self.is_set
+    def is_set(self) -> bool:
+        """Returns whether the event is set."""
+        return bool(connection.exists(self.name))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until the event is set or the :param timeout: in seconds passed.
+        Returns whether the event was set."""
+        with connection.pipeline() as pipe:
+            pipe.exists(self.name)
+            pipe.xrevrange(self.stream, count=1)
+            is_set, last_entries = pipe.execute()
         if is_set:
-            return
-        pubsub = connection.pubsub(ignore_subscribe_messages=True)
-        pubsub.subscribe(self.name)
-        next(pubsub.listen())
-        pubsub.close()
+            return True
+        last_id = last_entries[0][0] if last_entries else "0-0"
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            # Block in slices shorter than the socket timeout of the connection,
+            # a longer blocking read would be aborted with a TimeoutError.
+            block = EVENT_WAIT_SLICE
+            if deadline is not None:
+                block = min(block, max(0.001, deadline - time.monotonic()))
+            block_ms = int(block * 1000)
+            if connection.xread({self.stream: last_id}, count=1, block=block_ms):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
 
     def set(self) -> None:
         """Set the event and wake up all waiting threads."""
-        with self.lock:
-            self.is_set = True
-            connection.publish(self.name, "")
+        with connection.pipeline() as pipe:
+            pipe.set(self.name, 1)
+            # only the entries added while a waiter is blocked are relevant
+            pipe.xadd(self.stream, {"set": 1}, maxlen=100, approximate=True)
+            pipe.execute()
 
     def clear(self) -> None:
         """Clear this Event, allowing threads to wait for it."""
-        with self.lock:
-            self.is_set = False
+        connection.delete(self.name)
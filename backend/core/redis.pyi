@@ -1,4 +1,4 @@
-from typing import Dict, List, Literal, Tuple, overload
+from typing import Any, Dict, Iterable, List, Literal, Optional, Set, Tuple, overload
 
 from redis import Redis
 
@@ -7,12 +7,18 @@ DeviceInitialized = Literal[
 ]
 
 connection: Redis
+MIRRORED_KEYS: Set[str]
+STATE_PAGES: Tuple[str, ...]
+STATE_KEYS: Dict[str, Tuple[str, ...]]
+mirror: Dict[str, Any]
+EVENT_WAIT_SLICE: float
 
 def start() -> None: ...
 
 class Event:
     def __init__(self, name: str) -> None: ...
-    def wait(self) -> None: ...
+    def is_set(self) -> bool: ...
+    def wait(self, timeout: Optional[float] = None) -> bool: ...
     def set(self) -> None: ...
     def clear(self) -> None: ...
 
@@ -26,6 +32,7 @@ def get(
         "alarm_playing",
         "alarm_requested",
         "backup_playing",
+        "queue_rebalance_requested",
         "lights_active",
         "ring_initialized",
         "wled_initialized",
@@ -41,7 +48,7 @@ def get(
     ]
 ) -> bool: ...
 @overload
-def get(key: Literal["active_requests"]) -> int: ...
+def get(key: Literal["active_requests", "archive_generation"]) -> int: ...
 @overload
 def get(
     key: Literal["alarm_duration", "last_buzzer", "current_fps", "last_user_count_update"]
@@ -57,8 +64,6 @@ def get(key: Literal["current_resolution"]) -> Tuple[int, int]: ...
 @overload
 def get(key: Literal["bluetooth_devices"]) -> List[Dict[str, str]]: ...
 @overload
-def get(key: Literal["last_requests"]) -> Dict[str, float]: ...
-@overload
 def put(
     key: Literal[
         "playing",
@@ -68,13 +73,14 @@ def put(
         "alarm_playing",
         "alarm_requested",
         "backup_playing",
+        "queue_rebalance_requested",
         "lights_active",
         "ring_initialized",
         "wled_initialized",
         "strip_initialized",
         "screen_initialized",
         "has_internet",
-        "mopidy_available,
+        "mopidy_available",
         "youtube_available",
         "spotify_available",
         "soundcloud_available",
@@ -84,7 +90,7 @@ def put(
     value: bool,
 ) -> None: ...
 @overload
-def put(key: Literal["active_requests"], value: int) -> None: ...
+def put(key: Literal["active_requests", "archive_generation"], value: int) -> None: ...
 @overload
 def put(
     key: Literal["alarm_duration", "last_buzzer", "current_fps", "last_user_count_update"],
@@ -100,5 +106,6 @@ def put(key: Literal["resolutions"], value: List[Tuple[int, int]]) -> None: ...
 def put(key: Literal["current_resolution"], value: Tuple[int, int]) -> None: ...
 @overload
 def put(key: Literal["bluetooth_devices"], value: List[Dict[str, str]]) -> None: ...
-@overload
-def put(key: Literal["last_requests"], value: Dict[str, float]) -> None: ...
+def increment(key: Literal["active_requests", "archive_generation"]) -> int: ...
+def get_many(keys: Iterable[str]) -> List[Any]: ...
+def put_many(values: Dict[str, Any], expire: Optional[float] = None) -> None: ...
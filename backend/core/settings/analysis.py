@@ -182,5 +182,7 @@ def save_as_playlist(request: WSGIRequest) -> HttpResponse:
             playlist=playlist, index=song_index, url=external_url
         )
         song_index += 1
+    song_utils.update_playlist_entries_info(playlist)
+    song_utils.archive_changed()
 
     return HttpResponse()
@@ -5,14 +5,20 @@ from __future__ import annotations
 import subprocess
 
 from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
 from django.http import HttpResponse, HttpResponseBadRequest
 
 from core import redis, user_manager
-from core.musiq import playback
+from core.models import ArchivedSong
+from core.musiq import playback, song_utils
 from core.settings import storage
 from core.settings.settings import control
+from core.tasks import app
 from core.util import strtobool, extract_value
 
+# the number of songs whose forbidden flag is updated in one query
+FORBIDDEN_UPDATE_BATCH_SIZE = 500
+
 
 def start() -> None:
     """Initializes this module. Checks whether internet is accessible."""
@@ -198,9 +204,31 @@ def set_forbidden_keywords(request: WSGIRequest) -> HttpResponse:
     """Sets the keywords to filter out of results."""
     value, response = extract_value(request.POST)
     storage.put("forbidden_keywords", value)
+    _update_forbidden_songs.delay(value)
     return response
 
 
+@app.task
+def _update_forbidden_songs(keywords: str) -> None:
+    # The keywords are passed explicitly,
+    # the settings cache of the worker might not have been updated yet.
+    forbidden_ids = [
+        song_id
+        for song_id, artist, title in ArchivedSong.objects.values_list(
+            "id", "artist", "title"
+        ).iterator()
+        if song_utils.is_forbidden(artist, keywords)
+        or song_utils.is_forbidden(title, keywords)
+    ]
+    with transaction.atomic():
+        ArchivedSong.objects.filter(forbidden=True).update(forbidden=False)
+        for start in range(0, len(forbidden_ids), FORBIDDEN_UPDATE_BATCH_SIZE):
+            ArchivedSong.objects.filter(
+                id__in=forbidden_ids[start : start + FORBIDDEN_UPDATE_BATCH_SIZE]
+            ).update(forbidden=True)
+    song_utils.archive_changed()
+
+
 @control
 def set_people_to_party(request: WSGIRequest) -> HttpResponse:
     """Sets the amount of active clients needed to enable partymode."""
@@ -101,6 +101,8 @@ def _scan_files(library_path: str, filecount: int) -> Tuple[int, int]:
         if now - last_update > UPDATE_FREQUENCY:
             last_update = now
             _set_scan_progress(f"{filecount} / {files_scanned} / {files_added}")
+            # make the songs added so far available for suggestions
+            song_utils.archive_changed()
         for filename in filenames:
             files_scanned += 1
             path = os.path.join(dirpath, filename)
@@ -141,6 +143,7 @@ def _scan_library(library_path: str) -> None:
     files_scanned, files_added = _scan_files(library_path, filecount)
 
     assert files_scanned == filecount
+    song_utils.archive_changed()
     _set_scan_progress(f"{filecount} / {files_scanned} / {files_added}")
 
     logging.info("done scanning in %s", library_path)
@@ -208,7 +211,9 @@ def _create_playlists() -> None:
             list_id=playlist_id, title=playlist_title, counter=0
         )
         if not created:
-            # this playlist already exists, skip
+            # this playlist already exists, skip.
+            # Its first song might have been (re)added by a scan in the meantime
+            song_utils.update_playlist_entries_info(playlist)
             return song_urls
 
         song_index = 0
@@ -218,9 +223,11 @@ def _create_playlists() -> None:
             )
             files_added += 1
             song_index += 1
+        song_utils.update_playlist_entries_info(playlist)
 
         return song_urls
 
     _scan_folder(library_path)
+    song_utils.archive_changed()
 
     _set_scan_progress(f"{local_files} / {files_processed} / {files_added}")
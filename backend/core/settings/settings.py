@@ -18,7 +18,7 @@ from django.shortcuts import render
 
 from core import base, redis, tasks, user_manager
 from core.settings.storage import get
-from core.state_handler import send_state
+from core.state_handler import request_update, send_state, snapshot
 
 
 def control(
@@ -168,5 +168,10 @@ def index(request: WSGIRequest) -> HttpResponse:
 
 
 def update_state() -> None:
-    """Sends an update event to all connected clients."""
-    send_state(state_dict())
+    """Schedules an update event for all connected clients."""
+    request_update("settings")
+
+
+def send_update() -> None:
+    """Sends an update event to all clients of the settings page."""
+    send_state("settings", snapshot("settings", state_dict))
@@ -1,10 +1,15 @@
 """This module provides methods to access database settings."""
+import logging
+import os
+import threading
+import time
 from ast import literal_eval
-from typing import Union, Literal
+from typing import Dict, Iterable, List, Optional, Union, Literal
 
-from cachetools import TTLCache, cached
+from django.db import transaction
+from redis.exceptions import ConnectionError as RedisConnectionError
 
-from core import models
+from core import models, redis, state_handler
 from core.util import strtobool
 
 
@@ -39,7 +44,6 @@ defaults = {
     "ip_checking": False,
     "color_indication": Privileges.nobody,
     "color_offset": 0.0,
-    "next_color_index": 0,
     "downvotes_to_kick": 2,
     "logging_enabled": True,
     "hashtags_active": True,
@@ -132,31 +136,61 @@ defaults = {
     "dynamic_resolution": False,
 }
 
-# Settings change very rarely, cache them to reduce database roundtrips.
+# Settings change very rarely, every process caches all of them to avoid database roundtrips.
 # This is especially advantageous for suggestions which check whether platforms are enabled.
-# There is a data inconsistency issue when a setting is changed in one process.
-# Only that process would flush its cache, others would retain the stale value.
-# However, with the daphne setup there is currently only one process handling requests,
-# and settings are never changed outside a request (especially not in a celery worker).
-# So this is fine as long as no additional daphne (or other) workers are used.
-# However, settings are accessed in both the lights and the playback worker.
-# The lights flushes the cache in its update function.
-# The playback worker accesses the "paused" state very often,
-# so it is stored both in redis and the db.
-# Alternatively, the cache flush could be communicated through redis.
-cache: TTLCache = TTLCache(ttl=10, maxsize=128)
-
-
-@cached(cache)
-def get(key: str) -> Union[bool, int, float, str, tuple]:
-    """This method returns the value for the given :param key:.
-    Values of non-existing keys are set to their respective default value."""
+# Whenever a setting is changed, the change is broadcast through redis
+# and every process (daphne, celery, lights worker) clears its cache.
+# Thus, cached values never expire on their own and are still consistent across processes.
+cache: Dict[str, Union[bool, int, float, str, tuple]] = {}
+# increased whenever the cache is cleared.
+# Values read from the database are only cached if no change happened during the read
+_generation = 0
+# the process that is listening for changes, forked processes need their own listener
+_listener_pid: Optional[int] = None
+_listener_lock = threading.Lock()
+
+
+def clear_cache() -> None:
+    """Drops all cached settings of this process, they are read from the database again."""
+    global _generation
+    _generation += 1
+    cache.clear()
+
+
+def _listen(pubsub) -> None:
+    while True:
+        try:
+            for _ in pubsub.listen():
+                clear_cache()
+        except RedisConnectionError:
+            logging.warning(
+                "lost connection to redis, resubscribing to setting changes"
+            )
+            time.sleep(1)
+            # changes might have been missed in the meantime
+            clear_cache()
+
+
+def _ensure_listener() -> None:
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        # the cache might have been inherited from the parent process
+        clear_cache()
+        pubsub = redis.connection.pubsub(ignore_subscribe_messages=True)
+        # subscribe before anything is cached so no change is missed
+        pubsub.subscribe("settings_changed")
+        threading.Thread(target=_listen, args=(pubsub,), daemon=True).start()
+        _listener_pid = os.getpid()
+
+
+def _parse(key: str, value: str) -> Union[bool, int, float, str, tuple]:
     # values are stored as string in the database
     # cast the value to its respective type, defined by the default value, before returning it
     default = defaults[key]
-    value = models.Setting.objects.get_or_create(
-        key=key, defaults={"value": str(default)}
-    )[0].value
     if type(default) is str:
         return str(value)
     if type(default) is int:
@@ -171,6 +205,43 @@ def get(key: str) -> Union[bool, int, float, str, tuple]:
     raise ValueError(f"{key} not defined")
 
 
+def _load() -> Dict[str, Union[bool, int, float, str, tuple]]:
+    # loads all settings with a single query, creating missing ones with their default
+    values = dict(models.Setting.objects.values_list("key", "value"))
+    missing = [key for key in defaults if key not in values]
+    if missing:
+        models.Setting.objects.bulk_create(
+            [models.Setting(key=key, value=str(defaults[key])) for key in missing],
+            ignore_conflicts=True,
+        )
+        values.update(
+            models.Setting.objects.filter(key__in=missing).values_list("key", "value")
+        )
+    return {key: _parse(key, values[key]) for key in defaults}
+
+
+def get_many(keys: Iterable[str]) -> List[Union[bool, int, float, str, tuple]]:
+    """Returns the values for all given keys.
+    If any of them is not cached, all settings are loaded with a single query."""
+    _ensure_listener()
+    keys = list(keys)
+    try:
+        return [cache[key] for key in keys]
+    except KeyError:
+        pass
+    generation = _generation
+    values = _load()
+    if generation == _generation:
+        cache.update(values)
+    return [values[key] for key in keys]
+
+
+def get(key: str) -> Union[bool, int, float, str, tuple]:
+    """This method returns the value for the given :param key:.
+    Values of non-existing keys are set to their respective default value."""
+    return get_many([key])[0]
+
+
 def put(key: str, value: Union[bool, int, float, str, tuple]) -> None:
     """This method sets the :param value: for the given :param key:."""
     default = defaults[key]
@@ -179,4 +250,8 @@ def put(key: str, value: Union[bool, int, float, str, tuple]) -> None:
     )[0]
     setting.value = str(value)
     setting.save()
-    cache.clear()
+    clear_cache()
+    # notify the other processes once the change is visible to them
+    transaction.on_commit(lambda: redis.connection.publish("settings_changed", key))
+    # settings are part of the states
+    state_handler.invalidate_states()
@@ -1,6 +1,4 @@
-from typing import Literal, overload
-
-from cachetools import TTLCache
+from typing import Any, Dict, Iterable, List, Literal, overload
 
 # Sometimes the storage functions are accessed dynamically.
 # Comfort mypy by telling it the value will still be one of the specified ones.
@@ -49,7 +47,10 @@ DeviceProgram = Literal[
     "last_screen_program",
 ]
 
-cache: TTLCache = TTLCache(ttl=10, maxsize=128)
+cache: Dict[str, Any]
+
+def clear_cache() -> None: ...
+def get_many(keys: Iterable[str]) -> List[Any]: ...
 
 @overload
 def get(
@@ -81,7 +82,6 @@ def get(
 @overload
 def get(
     key: Literal[
-        "next_color_index",
         "downvotes_to_kick",
         "number_of_suggestions",
         "max_playlist_items",
@@ -180,7 +180,6 @@ def put(
 @overload
 def put(
     key: Literal[
-        "next_color_index",
         "downvotes_to_kick",
         "number_of_suggestions",
         "max_playlist_items",
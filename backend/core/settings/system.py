@@ -13,9 +13,9 @@ import cachetools.func
 import requests
 from django.conf import settings
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 
-from core import redis
+from core import redis, state_handler
 from core.settings import storage
 from core.settings.settings import control
 
@@ -23,14 +23,10 @@ from core.settings.settings import control
 def restart_mopidy() -> None:
     """Restarts the mopidy systemd service."""
     from core.musiq.mopidy_player import mopidy_lock
-    import redis.exceptions
 
     subprocess.call(["sudo", "/usr/local/sbin/raveberry/restart_mopidy"])
-    try:
-        mopidy_lock.release()
-    except redis.exceptions.LockError:
-        # the lock was already released
-        pass
+    # the lock might be held by another worker process, so it is removed directly
+    redis.connection.delete(mopidy_lock.name)
 
 
 def update_mopidy_config(output: str) -> None:
@@ -356,6 +352,20 @@ def get_changelog(_request: WSGIRequest) -> HttpResponse:
     return HttpResponse(changelog)
 
 
+@control
+def get_state_update_counters(_request: WSGIRequest) -> HttpResponse:
+    """Returns how many state updates were requested and sent for each page."""
+    return JsonResponse(state_handler.update_counters())
+
+
+@control
+def get_suggestion_cache_counters(_request: WSGIRequest) -> HttpResponse:
+    """Returns how many offline suggestions were served from the cache."""
+    from core.musiq import suggestions
+
+    return JsonResponse(suggestions.suggestion_cache_counters())
+
+
 @control
 def get_upgrade_config(_request: WSGIRequest) -> HttpResponse:
     """Returns the config that will be used for the upgrade."""
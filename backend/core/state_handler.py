@@ -1,40 +1,299 @@
 """This module handles realtime communication via websockets."""
+import bisect
+import importlib
 import json
-from typing import Any, Dict
+import time
+from typing import Any, Callable, Dict, List, Optional
 
 from asgiref.sync import async_to_sync
 from channels.generic.websocket import WebsocketConsumer
 from channels.layers import get_channel_layer
+from django.conf import settings as conf
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified
 
+from core import redis
+from core.util import run_later
 
-def send_state(state: Dict[str, Any]) -> None:
-    """Sends the given dictionary as a state update to all connected clients."""
-    data = {"type": "state_update", "state": state}
+# every page joins its own group and only receives the updates of its state
+PAGES = ["base", "musiq", "lights", "settings", "network_info"]
+
+# the modules that provide the state of each page
+PAGE_MODULES = {
+    "base": "core.base",
+    "musiq": "core.musiq.musiq",
+    "lights": "core.lights.lights",
+    "settings": "core.settings.settings",
+}
+
+
+def send_state(page: str, text: str) -> None:
+    """Sends the given serialized state to all clients of the given page."""
+    data = {"type": "state_update", "text": text}
     channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)("state", data)
+    async_to_sync(channel_layer.group_send)(page, data)
+
+
+def invalidate_states(*pages: str) -> None:
+    """Marks the cached states of the given pages as outdated by starting a new generation.
+    Without arguments, the states of all pages are marked."""
+    with redis.connection.pipeline() as pipe:
+        for page in pages or PAGE_MODULES:
+            pipe.incr(f"{page}_state_generation")
+        pipe.execute()
+
+
+def _current_generation(page: str) -> int:
+    return int(redis.connection.get(f"{page}_state_generation") or 0)
+
+
+def _cached_state(page: str, generation: int) -> Optional[Dict[str, str]]:
+    cache = redis.connection.hgetall(f"{page}_state_cache")
+    if not cache or int(cache["generation"]) != generation:
+        return None
+    return cache
+
+
+def _snapshot(page: str, state_dict: Callable[[], Dict[str, Any]]) -> Dict[str, str]:
+    generation = _current_generation(page)
+    cache = _cached_state(page, generation)
+    if cache is None:
+        cache = {
+            "generation": str(generation),
+            "state": json.dumps(state_dict()),
+            "time": str(time.time()),
+        }
+        redis.connection.hset(f"{page}_state_cache", mapping=cache)
+    return cache
+
+
+def snapshot(page: str, state_dict: Callable[[], Dict[str, Any]]) -> str:
+    """Returns the serialized state of the given page.
+    The state is only computed if nothing was cached for the current generation."""
+    return _snapshot(page, state_dict)["state"]
+
+
+def request_update(page: str) -> None:
+    """Marks the state of the given page as changed.
+    The state is computed and sent once the update interval has passed,
+    so all requests in the meantime result in a single update."""
+    if page == "base":
+        # the base state is part of every page
+        invalidate_states()
+    else:
+        invalidate_states(page)
+    _schedule_update(page)
+
+
+def _schedule_update(page: str) -> None:
+    redis.connection.hincrby("state_updates", f"{page}_requested")
+    run_later(f"{page}_update", conf.STATE_UPDATE_INTERVAL, lambda: _send_update(page))
+
+
+def _send_update(page: str) -> None:
+    importlib.import_module(PAGE_MODULES[page]).send_update()
+    redis.connection.hincrby("state_updates", f"{page}_sent")
+
+
+def update_counters() -> Dict[str, int]:
+    """Returns how many updates were requested and how many were actually sent per page."""
+    counters = redis.connection.hgetall("state_updates")
+    return {
+        f"{page}_{kind}": int(counters.get(f"{page}_{kind}", 0))
+        for page in PAGE_MODULES
+        for kind in ["requested", "sent"]
+    }
+
+
+def _stable_ids(old_ids: List[int], new_ids: List[int]) -> set:
+    # Returns the ids that keep their relative order (longest increasing subsequence
+    # of the old positions). All other surviving items need to be moved.
+    old_positions = {item_id: position for position, item_id in enumerate(old_ids)}
+    survivors = [item_id for item_id in new_ids if item_id in old_positions]
+    tails: List[int] = []
+    tail_ids: List[int] = []
+    predecessors: Dict[int, Optional[int]] = {}
+    for item_id in survivors:
+        position = old_positions[item_id]
+        slot = bisect.bisect_left(tails, position)
+        predecessors[item_id] = tail_ids[slot - 1] if slot > 0 else None
+        if slot == len(tails):
+            tails.append(position)
+            tail_ids.append(item_id)
+        else:
+            tails[slot] = position
+            tail_ids[slot] = item_id
+    stable = set()
+    current = tail_ids[-1] if tail_ids else None
+    while current is not None:
+        stable.add(current)
+        current = predecessors[current]
+    return stable
+
+
+def _diff_list(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, List]:
+    # Computes the operations that turn the old list of items into the new one.
+    # Clients first apply updates, then detach removed and moved items
+    # and finally place inserted and moved items in ascending order of their position.
+    old_items = {item["id"]: item for item in old}
+    new_ids = [item["id"] for item in new]
+    stable = _stable_ids([item["id"] for item in old], new_ids)
+    remaining = set(new_ids)
+    remove = [item_id for item_id in old_items if item_id not in remaining]
+    update = []
+    place: List[List[Any]] = []
+    for position, item in enumerate(new):
+        old_item = old_items.get(item["id"])
+        if old_item is None or old_item.keys() != item.keys():
+            if old_item is not None:
+                remove.append(item["id"])
+            place.append(["insert", position, item])
+            continue
+        changed = {key: value for key, value in item.items() if old_item[key] != value}
+        if changed:
+            update.append([item["id"], changed])
+        if item["id"] not in stable:
+            place.append(["move", position, item["id"]])
+    return {"remove": remove, "update": update, "place": place}
+
+
+def _diff(page: str, old: Dict[str, Any], new: Dict[str, Any]) -> Optional[Dict]:
+    # Returns the patch from the old to the new state
+    # or None if the states are too different to be patched.
+    if old.keys() != new.keys() or old[page].keys() != new[page].keys():
+        return None
+    changes = {}
+    lists = {}
+    for key, value in new[page].items():
+        old_value = old[page][key]
+        if (
+            isinstance(value, list)
+            and isinstance(old_value, list)
+            and all(isinstance(item, dict) and "id" in item for item in value)
+            and all(isinstance(item, dict) and "id" in item for item in old_value)
+        ):
+            lists[key] = _diff_list(old_value, value)
+        elif old_value != value:
+            changes[key] = value
+    return {
+        "page": page,
+        # the base state is small, it is sent completely
+        "base": {key: value for key, value in new.items() if key != page},
+        "changes": changes,
+        "lists": lists,
+    }
+
+
+def send_state_patch(
+    page: str, state_dict: Callable[[], Dict[str, Any]]
+) -> Dict[str, str]:
+    """Computes the state of the given page and sends the difference to the last one
+    to all clients of this page. Each update is numbered,
+    so clients can detect missed updates and resync with the state endpoint.
+    The state is cached together with its version, which is also returned.
+    If the state was already sent for the current generation, nothing is done."""
+    generation = _current_generation(page)
+    cached = _cached_state(page, generation)
+    if cached is not None:
+        return cached
+    text = json.dumps(state_dict())
+    # normalize the state to what the clients receive, e.g. tuples become lists
+    state = json.loads(text)
+    with redis.connection.lock(f"{page}_state_lock"):
+        previous = redis.connection.hget(f"{page}_state_cache", "state")
+        version = redis.connection.incr(f"{page}_state_version")
+        cache = {
+            "generation": str(generation),
+            "state": text,
+            "time": str(time.time()),
+            "version": str(version),
+        }
+        redis.connection.hset(f"{page}_state_cache", mapping=cache)
+        message = None
+        if previous is not None:
+            previous_state = json.loads(previous)
+            message = _diff(page, previous_state, state)
+            if any(
+                previous_state.get(key) != value
+                for key, value in state.items()
+                if key != page
+            ):
+                # Clients of the other pages need to know about changes of the base state.
+                # The state of this page was just computed and stays valid.
+                invalidate_states(*(other for other in PAGE_MODULES if other != page))
+                _schedule_update("base")
+        if message is None:
+            # no state to compare against, send the whole state
+            message = {**state, "page": page}
+        message["version"] = version
+        send_state(page, json.dumps(message))
+    return cache
+
+
+def get_state(request: WSGIRequest, module, versioned: bool = False) -> HttpResponse:
+    """Returns the state of the given module.
+    The state is only computed if it changed since it was cached.
+    Its generation is used as ETag, so clients can revalidate their copy.
+    Versioned states are also sent to all clients,
+    so the returned version is the base for the following patches."""
+    from core import user_manager
+
+    page = module.__name__.split(".")[-1]
+    # the user count is part of every state,
+    # users become inactive without a request that changes any state
+    user_manager.expire_users()
+    generation = _current_generation(page)
+    cache = _cached_state(page, generation)
+    if cache is None:
+        if versioned:
+            cache = send_state_patch(page, module.state_dict)
+        else:
+            cache = _snapshot(page, module.state_dict)
+    text = cache["state"]
 
+    time_dependent = False
+    if hasattr(module, "advance_state"):
+        # the cached state might describe an earlier point in time
+        state = json.loads(text)
+        time_dependent = module.advance_state(state, time.time() - float(cache["time"]))
+        if time_dependent:
+            text = json.dumps(state)
 
-def get_state(_request: WSGIRequest, module) -> JsonResponse:
-    """Calls the get_state function of the given module and returns its result."""
-    state = module.state_dict()
-    return JsonResponse(state)
+    etag = f'"{generation}"'
+    response: HttpResponse
+    if not time_dependent and request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(text, content_type="application/json")
+    if not time_dependent:
+        response["ETag"] = etag
+    # always revalidate instead of using a possibly outdated copy
+    response["Cache-Control"] = "no-cache"
+    if versioned:
+        response["X-State-Version"] = cache["version"]
+    return response
 
 
 class StateConsumer(WebsocketConsumer):
     """Handles connections with websocket clients."""
 
     def connect(self) -> None:
-        async_to_sync(self.channel_layer.group_add)("state", self.channel_name)
+        self.page = self.scope["url_route"]["kwargs"]["page"]
+        if self.page not in PAGES:
+            self.close()
+            return
+        async_to_sync(self.channel_layer.group_add)(self.page, self.channel_name)
         self.accept()
 
     def disconnect(self, code: int) -> None:
-        async_to_sync(self.channel_layer.group_discard)("state", self.channel_name)
+        if self.page in PAGES:
+            async_to_sync(self.channel_layer.group_discard)(
+                self.page, self.channel_name
+            )
 
     def receive(self, text_data: str = None, bytes_data: bytes = None) -> None:
         pass
 
     def state_update(self, event: Dict[str, Any]):
         """Receives a message from the room group and sends it back to the websocket."""
-        self.send(text_data=json.dumps(event["state"]))
+        self.send(text_data=event["text"])
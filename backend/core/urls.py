@@ -104,7 +104,7 @@ urlpatterns.append(
                 path(
                     "musiq/state/",
                     state_handler.get_state,
-                    {"module": musiq},
+                    {"module": musiq, "versioned": True},
                     name="musiq-state",
                 ),
                 path("musiq/", include(musiq_paths)),
@@ -1,20 +1,17 @@
 """This module manages and counts user accesses and handles permissions."""
 import re
-from ast import literal_eval
 import colorsys
 import random
 import time
 from functools import wraps
-from typing import Callable, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 import ipware
-from django.contrib.sessions.models import Session
+from django.conf import settings as conf
 from django.core.handlers.wsgi import WSGIRequest
-from django.db import transaction
 from django.http import HttpResponse, HttpResponseBadRequest
-from django.utils import timezone
 
-from core import redis
+from core import redis, state_handler
 
 # kick users after some time without any request
 from core.lights import leds
@@ -24,6 +21,46 @@ from core.util import extract_value
 
 INACTIVITY_PERIOD = 600
 
+# vote entries expire to avoid accumulation over long runtimes
+VOTE_EXPIRY = 24 * 60 * 60
+
+# The engagement of a song is stored in the hash "engagement-<queue_key>".
+# It maps each session key to its vote. The requester is stored in this additional field,
+# which can not clash with session keys, as these are alphanumeric.
+REQUESTER_FIELD = "_requested_by"
+
+# Adds the given amount to a vote, clamping it to [-1, 1]
+# This helps recovering from desyncs after redis was cleared
+# but client votes are still locked in
+_add_vote = redis.connection.register_script(
+    """
+    local vote = redis.call("HINCRBY", KEYS[1], ARGV[1], ARGV[2])
+    if vote > 1 or vote < -1 then
+        vote = math.max(-1, math.min(1, vote))
+        redis.call("HSET", KEYS[1], ARGV[1], vote)
+    end
+    if vote == 0 then
+        redis.call("HDEL", KEYS[1], ARGV[1])
+    end
+    redis.call("EXPIRE", KEYS[1], ARGV[3])
+    return vote
+    """
+)
+
+# Adds the given amount to a vote if the result stays within [-1, 1]
+# Returns whether the vote was performed
+_try_vote = redis.connection.register_script(
+    """
+    local vote = tonumber(redis.call("HGET", KEYS[1], ARGV[1]) or "0") + ARGV[2]
+    if vote > 1 or vote < -1 then
+        return 0
+    end
+    redis.call("HSET", KEYS[1], ARGV[1], vote)
+    redis.call("EXPIRE", KEYS[1], ARGV[3])
+    return 1
+    """
+)
+
 
 def has_controls(user) -> bool:
     """Determines whether the given user is allowed to control playback."""
@@ -48,26 +85,32 @@ def has_privilege(user, privilege: Privileges):
 def update_user_count() -> None:
     """Go through all recent requests and delete those that were too long ago."""
     now = time.time()
-    last_requests = redis.get("last_requests")
-    for key, value in list(last_requests.items()):
-        if now - value >= INACTIVITY_PERIOD:
-            del last_requests[key]
-            redis.put("last_requests", last_requests)
+    # remove every client whose last request was at least INACTIVITY_PERIOD ago
+    if redis.connection.zremrangebyscore(
+        "active_users", "-inf", now - INACTIVITY_PERIOD
+    ):
+        # the user count is part of every state
+        state_handler.invalidate_states()
     redis.put("last_user_count_update", now)
 
 
+def expire_users() -> None:
+    """Updates the number of active users after an interval since the last update."""
+    if time.time() - redis.get("last_user_count_update") >= 60:
+        update_user_count()
+
+
 def get_count() -> int:
     """Returns the number of currently active users.
     Updates this number after an intervals since the last update."""
-    if time.time() - redis.get("last_user_count_update") >= 60:
-        update_user_count()
-    return len(redis.get("last_requests"))
+    expire_users()
+    return redis.connection.zcard("active_users")
 
 
 def partymode_enabled() -> bool:
     """Determines whether partymode is enabled,
     based on the number of currently active users."""
-    return len(redis.get("last_requests")) >= storage.get("people_to_party")
+    return redis.connection.zcard("active_users") >= storage.get("people_to_party")
 
 
 def get_client_ip(request: WSGIRequest):
@@ -81,111 +124,93 @@ def get_client_ip(request: WSGIRequest):
 def try_vote(request_ip: str, queue_key: int, amount: int) -> bool:
     """If the user can not vote any more for the song into the given direction, return False.
     Otherwise, perform the vote and returns True."""
-    # Votes are stored as individual (who, what) tuples in redis.
-    # A mapping who -> [what, ...] is not used,
-    # because each modification would require deserialization and subsequent serialization.
-    # Without such a mapping we cannot easily find all votes belonging to a session key,
-    # which would be required to update the view of a user whose client-votes got desynced.
-    # This should never happen during normal usage, so we optimize for our main use case:
-    # looking up whether a single user voted for a single song, which is constant with tuples.
+    # The votes of each ip are stored in a hash per song.
     # Since this feature indexes by the request IP and not the session_key,
     # it can not share its data structure with the votes for the color indicators.
-    entry = str((request_ip, queue_key))
-    allowed = True
-
-    # redis transaction: https://github.com/Redis/redis-py#pipelines
-    def check_entry(pipe) -> None:
-        nonlocal allowed
-        vote = pipe.get(entry)
-        if vote is None:
-            new_vote = amount
-        else:
-            new_vote = int(vote) + amount
-        if new_vote < -1 or new_vote > 1:
-            allowed = False
-            return
-        allowed = True
-        # expire these entries to avoid accumulation over long runtimes.
-        pipe.multi()
-        pipe.set(entry, new_vote, ex=24 * 60 * 60)
-
-    redis.connection.transaction(check_entry, entry)
-    return allowed
-
-
-def _get_next_color():
-    with transaction.atomic():
-        next_index = storage.get("next_color_index")
-        storage.put("next_color_index", next_index + 1)
+    return bool(
+        _try_vote(
+            keys=[f"ip_votes-{queue_key}"], args=[request_ip, amount, VOTE_EXPIRY]
+        )
+    )
 
-    offset = storage.get("color_offset")
 
-    hue = offset + next_index * (137.508 / 360)  # approximation for the golden angle
-    color = colorsys.hsv_to_rgb(hue, 0.4, 1)
+def _get_next_colors(count: int) -> List[str]:
+    # the index is incremented atomically, concurrent requests receive different colors
+    next_index = redis.connection.incrby("next_color_index", count) - count
+
+    offset = storage.get("color_offset")
 
-    return "#%02x%02x%02x" % tuple(round(v * 255) for v in color)
+    colors = []
+    for index in range(next_index, next_index + count):
+        hue = offset + index * (137.508 / 360)  # approximation for the golden angle
+        color = colorsys.hsv_to_rgb(hue, 0.4, 1)
+        colors.append("#%02x%02x%02x" % tuple(round(v * 255) for v in color))
+    return colors
 
 
 def color_of(session_key: str) -> Optional[str]:
-    if not session_key or storage.get("color_indication") == storage.Privileges.nobody:
-        return None
+    return colors_of([session_key]).get(session_key)
+
+
+def colors_of(session_keys: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Returns the colors of the given sessions, assigning new colors where necessary.
+    The number of redis round-trips does not depend on the number of sessions."""
+    session_keys = list({session_key for session_key in session_keys if session_key})
+    if not session_keys or storage.get("color_indication") == storage.Privileges.nobody:
+        return {}
     # no transaction because this is called many times and at worst race conditions would result
     # in a different color being set
-    color = redis.connection.get("color-" + session_key)
-    if color is None:
-        color = _get_next_color()
+    colors = dict(
+        zip(
+            session_keys,
+            redis.connection.mget(
+                ["color-" + session_key for session_key in session_keys]
+            ),
+        )
+    )
+    uncolored = [session_key for session_key, color in colors.items() if color is None]
+    if uncolored:
+        colors.update(zip(uncolored, _get_next_colors(len(uncolored))))
     # TODO: this is lost on server restart.
     # maybe store the color client side so it can be recovered?
-    redis.connection.set("color-" + session_key, color, ex=24 * 60 * 60)
-    return color
+    with redis.connection.pipeline(transaction=False) as pipe:
+        for session_key, color in colors.items():
+            pipe.set("color-" + session_key, color, ex=24 * 60 * 60)
+        pipe.execute()
+    return colors
 
 
 def register_song(request: WSGIRequest, queue_key: int) -> None:
-    # For each song, identified by its queue_key, the following information is stored:
-    # (<session_key>, {<session_key>: <vote>, …})
+    # For each song, identified by its queue_key, the requester is stored in its engagement.
     # This requires a session_key, thus it can only be used in @tracked functions
-    session_key = request.session.session_key
-
     key = f"engagement-{queue_key}"
-
-    def update_entry(pipe) -> None:
-        value = pipe.get(key)
-        engagement = None if value is None else literal_eval(value)
-        if engagement is None:
-            engagement = (None, {})
-        _, votes = engagement
-        # expire these entries to avoid accumulation over long runtimes.
-        pipe.multi()
-        pipe.set(key, str((session_key, votes)), ex=24 * 60 * 60)
-
-    redis.connection.transaction(update_entry, key)
+    with redis.connection.pipeline() as pipe:
+        pipe.hset(key, REQUESTER_FIELD, request.session.session_key)
+        pipe.expire(key, VOTE_EXPIRY)
+        pipe.execute()
 
 
 def register_vote(request: WSGIRequest, queue_key: int, amount: int) -> None:
-    session_key = request.session.session_key
-
-    key = f"engagement-{queue_key}"
-
-    def update_entry(pipe) -> None:
-        value = pipe.get(key)
-        engagement = None if value is None else literal_eval(value)
-        if engagement is None:
-            engagement = (None, {})
-        requested_by, votes = engagement
-        if session_key in votes:
-            votes[session_key] += amount
-        else:
-            votes[session_key] = amount
-        # clamp votes to [-1,1]. This helps recovering from desyncs after redis was cleared
-        # but client votes are still locked in
-        votes[session_key] = max(-1, min(1, votes[session_key]))
-        if votes[session_key] == 0:
-            del votes[session_key]
-        # expire these entries to avoid accumulation over long runtimes.
-        pipe.multi()
-        pipe.set(key, str((requested_by, votes)), ex=24 * 60 * 60)
-
-    redis.connection.transaction(update_entry, key)
+    _add_vote(
+        keys=[f"engagement-{queue_key}"],
+        args=[request.session.session_key, amount, VOTE_EXPIRY],
+    )
+
+
+def get_engagements(
+    queue_keys: List[int],
+) -> List[Tuple[Optional[str], Dict[str, int]]]:
+    """Returns the requester and the votes of every session for each of the given songs."""
+    with redis.connection.pipeline(transaction=False) as pipe:
+        for queue_key in queue_keys:
+            pipe.hgetall(f"engagement-{queue_key}")
+        entries = pipe.execute()
+    engagements = []
+    for entry in entries:
+        requested_by = entry.pop(REQUESTER_FIELD, None)
+        votes = {session_key: int(vote) for session_key, vote in entry.items()}
+        engagements.append((requested_by, votes))
+    return engagements
 
 
 def set_user_color(request: WSGIRequest) -> HttpResponse:
@@ -201,6 +226,17 @@ def set_user_color(request: WSGIRequest) -> HttpResponse:
     return response
 
 
+def _first_session_created() -> bool:
+    """Registers the creation of a session and returns whether no other session is active.
+    Instead of counting the sessions in the database, a redis key is kept alive
+    for as long as the most recently created session."""
+    with redis.connection.pipeline() as pipe:
+        pipe.set("sessions_active", 1, nx=True, ex=conf.SESSION_COOKIE_AGE)
+        pipe.expire("sessions_active", conf.SESSION_COOKIE_AGE)
+        first, _ = pipe.execute()
+    return bool(first)
+
+
 def tracked(
     func: Callable[[WSGIRequest], HttpResponse]
 ) -> Callable[[WSGIRequest], HttpResponse]:
@@ -212,19 +248,16 @@ def tracked(
         if not request.session or not request.session.session_key:
             # if there are no active sessions (= this is the first one)
             # reset the color index and choose a new offset.
-            active_sessions = Session.objects.filter(
-                expire_date__gte=timezone.now()
-            ).count()
-            if active_sessions == 0:
+            if _first_session_created():
                 storage.put("color_offset", random.random())
-                storage.put("next_color_index", 0)
+                redis.connection.set("next_color_index", 0)
 
             request.session.save()
 
         request_ip = get_client_ip(request)
-        last_requests = redis.get("last_requests")
-        last_requests[request_ip] = time.time()
-        redis.put("last_requests", last_requests)
+        # only new clients change the user count
+        if redis.connection.zadd("active_users", {request_ip: time.time()}):
+            state_handler.invalidate_states()
 
         def check():
             active = redis.get("active_requests")
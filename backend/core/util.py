@@ -1,8 +1,11 @@
 """This module provides app wide utility functions."""
+import logging
 import subprocess
+import threading
 from contextlib import contextmanager
-from typing import List, Tuple, ContextManager, Generator
+from typing import Callable, Dict, List, Tuple, ContextManager, Generator
 
+from django import db
 from django.http import (
     HttpResponseForbidden,
     HttpResponseBadRequest,
@@ -31,6 +34,35 @@ def optional(condition: bool, context_manager: ContextManager) -> Generator:
         yield
 
 
+_scheduled: Dict[str, threading.Timer] = {}
+_scheduled_lock = threading.Lock()
+
+
+def run_later(name: str, delay: float, function: Callable[[], None]) -> None:
+    """Calls :param function: in a background thread of this process
+    after :param delay: seconds. Calls with the same :param name: until then are merged.
+    Used to batch frequent changes without occupying a celery worker."""
+    with _scheduled_lock:
+        if name in _scheduled:
+            return
+
+        def _run() -> None:
+            with _scheduled_lock:
+                # changes from now on schedule another call
+                del _scheduled[name]
+            try:
+                function()
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("delayed call %s failed", name)
+            finally:
+                db.connection.close()
+
+        timer = threading.Timer(delay, _run)
+        timer.daemon = True
+        _scheduled[name] = timer
+        timer.start()
+
+
 def camelize(snake_dict: dict) -> dict:
     """Transforms each key of the given dict from snake_case to CamelCase."""
 
@@ -142,6 +142,9 @@ MOPIDY_PORT = os.environ.get("MOPIDY_PORT", "") or MOPIDY_PORT
 ICECAST_HOST = os.environ.get("ICECAST_HOST", "") or ICECAST_HOST
 ICECAST_PORT = os.environ.get("ICECAST_PORT", "") or ICECAST_PORT
 
+# Each page sends at most one state update per this many seconds
+STATE_UPDATE_INTERVAL = float(os.environ.get("STATE_UPDATE_INTERVAL", "0.075"))
+
 # Database
 if DEBUG:
     DATABASES = {
@@ -168,6 +171,7 @@ CELERY_IMPORTS = [
     "core.lights.worker",
     "core.musiq.playback",
     "core.musiq.music_provider",
+    "core.settings.basic",
     "core.settings.library",
     "core.settings.sound",
 ]
@@ -204,6 +208,18 @@ LOGIN_REDIRECT_URL = "musiq"
 LOGOUT_REDIRECT_URL = "musiq"
 # only preserve user sessions for an hour
 # SESSION_COOKIE_AGE = 3600
+# Sessions are stored in the database by default.
+# Storing them in redis avoids a database write for every new client,
+# but logins are lost when redis is restarted.
+if strtobool(os.environ.get("DJANGO_CACHED_SESSIONS", "0")):
+    SESSION_ENGINE = "django.contrib.sessions.backends.cache"
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}",
+            "KEY_PREFIX": "sessions",
+        }
+    }
 
 # Static files (CSS, JavaScript, Images)
 STATIC_FILES = os.path.join(BASE_DIR, "static")
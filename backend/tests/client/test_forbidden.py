@@ -0,0 +1,87 @@
+import importlib
+
+from django.apps import apps
+
+from core.models import ArchivedSong
+from core.musiq import suggestions, song_utils
+from core.settings import basic, storage
+from tests.raveberry_test import RaveberryTest
+
+
+class ForbiddenSongTests(RaveberryTest):
+    def _archive(self, artist: str, title: str) -> ArchivedSong:
+        return ArchivedSong.objects.create(
+            url=f"local_library/{artist}/{title}",
+            artist=artist,
+            title=title,
+            duration=60,
+            counter=1,
+            cached=True,
+        )
+
+    def _forbidden(self):
+        return set(
+            ArchivedSong.objects.filter(forbidden=True).values_list("title", flat=True)
+        )
+
+    def test_keywords(self) -> None:
+        self.assertFalse(song_utils.is_forbidden("anything", ""))
+        self.assertTrue(song_utils.is_forbidden("Some Explicit Song", "explicit"))
+        # every keyword is a regular expression on its own,
+        # backreferences and global flags refer to their own keyword
+        keywords = r"(a)\1, (?i)(b)\1"
+        self.assertTrue(song_utils.is_forbidden("xaax", keywords))
+        self.assertTrue(song_utils.is_forbidden("xbbx", keywords))
+        self.assertFalse(song_utils.is_forbidden("xabx", keywords))
+
+    def test_flag_on_save(self) -> None:
+        storage.put("forbidden_keywords", "explicit")
+        self._archive("Artist", "Explicit Song")
+        self._archive("Explicit Artist", "Song")
+        clean = self._archive("Artist", "Clean Song")
+        self.assertEqual(self._forbidden(), {"Explicit Song", "Song"})
+
+        clean.title = "Clean Explicit Song"
+        clean.save()
+        self.assertEqual(
+            self._forbidden(), {"Explicit Song", "Song", "Clean Explicit Song"}
+        )
+
+    def test_update_forbidden_songs(self) -> None:
+        self._archive("Artist", "Explicit Song")
+        self._archive("Artist", "Rude Song")
+        self._archive("Artist", "Clean Song")
+        self.assertEqual(self._forbidden(), set())
+
+        basic._update_forbidden_songs("explicit rude")
+        self.assertEqual(self._forbidden(), {"Explicit Song", "Rude Song"})
+        # songs that are no longer matched are allowed again
+        basic._update_forbidden_songs("rude")
+        self.assertEqual(self._forbidden(), {"Rude Song"})
+        basic._update_forbidden_songs("")
+        self.assertEqual(self._forbidden(), set())
+
+    def test_migration(self) -> None:
+        migration = importlib.import_module(
+            "core.migrations.0022_archivedsong_forbidden"
+        )
+        self._archive("Artist", "Explicit Song")
+        self._archive("Artist", "Clean Song")
+        storage.put("forbidden_keywords", "explicit")
+        migration.fill_forbidden(apps, None)
+        self.assertEqual(self._forbidden(), {"Explicit Song"})
+
+    def test_full_text_index_after_migration(self) -> None:
+        if not suggestions._fts_available():
+            self.skipTest("the full text index is only used with SQLite and FTS5")
+        # the triggers keeping the index in sync were recreated after adding the field
+        song = self._archive("Artist", "Indexed Song")
+        self.assertEqual(
+            [result["u_id"] for result in suggestions._fts_song_results("indexed")],
+            [song.id],
+        )
+        song.title = "Renamed Song"
+        song.save()
+        self.assertEqual(suggestions._fts_song_results("indexed"), [])
+        song.delete()
+        self.assertEqual(suggestions._fts_song_results("renamed"), [])
@@ -0,0 +1,56 @@
+from unittest.mock import patch
+
+from core import leader, redis
+from core.musiq import playback
+from tests.raveberry_test import RaveberryTest
+
+
+class LeaderTests(RaveberryTest):
+    def setUp(self) -> None:
+        super().setUp()
+        redis.connection.delete(leader.LEADER_KEY)
+        self.addCleanup(redis.connection.delete, leader.LEADER_KEY)
+        for key in redis.connection.scan_iter(match=leader.WORKER_PREFIX + "*"):
+            redis.connection.delete(key)
+        # the campaign is not started
+        patch("core.leader.threading.Thread").start()
+        self.addCleanup(patch.stopall)
+        self.addCleanup(leader._leading.clear)
+
+    def test_terms(self) -> None:
+        # loops started without an election are not fenced
+        self.assertTrue(leader.holds(None))
+        self.assertTrue(leader._claim())
+        first_term = leader._token
+        self.assertTrue(leader.holds(first_term))
+        self.assertFalse(leader._claim())
+
+        # the leadership expired and the same process was elected again
+        redis.connection.delete(leader.LEADER_KEY)
+        self.assertTrue(leader._claim())
+        self.assertFalse(leader.holds(first_term))
+        self.assertTrue(leader.holds(leader._token))
+
+    def test_playback_loop_stops_after_term(self) -> None:
+        self.assertTrue(leader._claim())
+        ended_term = leader._token
+        redis.connection.set(leader.LEADER_KEY, "another worker")
+        # returns instead of waiting for songs
+        playback.Playback(ended_term).loop()
+
+    def test_first_worker_resets_state(self) -> None:
+        elections = []
+        leader.run(elections.append)
+        self.assertEqual(elections, [False])
+
+    def test_restarted_worker_keeps_state(self) -> None:
+        # a follower is still serving clients
+        redis.connection.set(leader.WORKER_PREFIX + "follower", 1)
+        redis.start()
+        self.assertTrue(redis.connection.exists(leader.WORKER_PREFIX + "follower"))
+
+        # the restarted worker is elected, but the state of the follower is kept
+        elections = []
+        leader.run(elections.append)
+        self.assertEqual(elections, [True])
+        self.assertTrue(leader._others_alive())
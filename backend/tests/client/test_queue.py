@@ -105,6 +105,27 @@ class QueueTests(MusicTest):
             == [key2, key1, key4, key3]
         )
 
+    def test_positions(self) -> None:
+        state = json.loads(self.client.get(reverse("musiq-state")).content)
+        key1, key2, key3, key4 = (
+            state["musiq"]["songQueue"][index]["id"] for index in range(4)
+        )
+
+        # the index of each song is its position in the queue,
+        # even after songs are moved or removed
+        self.client.post(
+            reverse("reorder"),
+            {"prev": str(key3), "element": str(key1), "next": str(key4)},
+        )
+        self.client.post(reverse("remove"), {"key": str(key2)})
+        state = self._poll_musiq_state(
+            lambda state: [song["id"] for song in state["musiq"]["songQueue"]]
+            == [key3, key1, key4]
+        )
+        self.assertEqual(
+            [song["index"] for song in state["musiq"]["songQueue"]], [1, 2, 3]
+        )
+
     def test_remove_all(self) -> None:
         self.client.post(reverse("remove-all"))
         self._poll_musiq_state(lambda state: len(state["musiq"]["songQueue"]) == 0)
@@ -0,0 +1,80 @@
+import multiprocessing
+import threading
+import time
+from unittest.mock import patch
+
+from core import redis
+from tests.raveberry_test import RaveberryTest
+
+
+def _wait_for_event(name: str, timeout: float) -> None:
+    # the exit code reports to the parent process whether the event was set
+    raise SystemExit(0 if redis.Event(name).wait(timeout) else 1)
+
+
+class EventTests(RaveberryTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.event = redis.Event("test_event")
+        self.event.clear()
+
+    def test_set_and_clear(self) -> None:
+        self.assertFalse(self.event.is_set())
+        self.event.set()
+        self.assertTrue(self.event.is_set())
+        # waiting for a set event returns immediately
+        self.assertTrue(self.event.wait(timeout=0))
+        self.event.clear()
+        self.assertFalse(self.event.is_set())
+
+    def test_wait_timeout(self) -> None:
+        start = time.time()
+        self.assertFalse(self.event.wait(timeout=0.2))
+        self.assertGreaterEqual(time.time() - start, 0.2)
+
+    def test_set_wakes_up_waiting_thread(self) -> None:
+        results = []
+        waiter = threading.Thread(
+            target=lambda: results.append(self.event.wait(timeout=5))
+        )
+        waiter.start()
+        time.sleep(0.2)
+        self.event.set()
+        waiter.join(timeout=5)
+        self.assertEqual(results, [True])
+
+    def test_wait_longer_than_socket_timeout(self) -> None:
+        # redis-py aborts reads that block longer than its socket timeout of 5 seconds
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(self.event.wait()))
+        with patch.object(
+            redis.connection, "xread", wraps=redis.connection.xread
+        ) as xread:
+            waiter.start()
+            time.sleep(6)
+            self.assertEqual(results, [])
+            self.event.set()
+            waiter.join(timeout=5)
+        self.assertEqual(results, [True])
+        # every read blocked for a bounded time, 0 would block indefinitely
+        for call in xread.call_args_list:
+            self.assertGreater(call.kwargs["block"], 0)
+            self.assertLess(call.kwargs["block"], 5000)
+        # timeouts longer than a single blocking read are kept as well
+        self.event.clear()
+        start = time.time()
+        self.assertFalse(self.event.wait(timeout=2.5))
+        self.assertGreaterEqual(time.time() - start, 2.5)
+
+    def test_set_wakes_up_waiting_process(self) -> None:
+        waiter = multiprocessing.get_context("fork").Process(
+            target=_wait_for_event, args=(self.event.name, 5)
+        )
+        waiter.start()
+        time.sleep(0.5)
+        start = time.time()
+        self.event.set()
+        waiter.join(timeout=5)
+        self.assertEqual(waiter.exitcode, 0)
+        # the waiter was woken up instead of running into its timeout
+        self.assertLess(time.time() - start, 4)
@@ -0,0 +1,62 @@
+from core.models import ArchivedQuery, ArchivedSong
+from core.musiq import song_index, song_utils
+from tests.raveberry_test import RaveberryTest
+
+
+class SongIndexTests(RaveberryTest):
+    def _archive(self, artist: str, title: str) -> ArchivedSong:
+        song = ArchivedSong.objects.create(
+            url=f"local_library/{artist}/{title}",
+            artist=artist,
+            title=title,
+            duration=60,
+            counter=1,
+            cached=True,
+        )
+        song_utils.archive_changed()
+        return song
+
+    def _search(self, query: str):
+        return [song_id for song_id, _ in song_index.search(query, 10)]
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.beatles = self._archive("The Beatles", "Let It Be")
+        self.beach = self._archive("Beach Boys", "Good Vibrations")
+        self.abba = self._archive("ABBA", "Dancing Queen")
+
+    def test_search(self) -> None:
+        self.assertEqual(self._search("beatles"), [self.beatles.id])
+        # every term needs to be contained, in any field
+        self.assertEqual(self._search("BEA let"), [self.beatles.id])
+        self.assertEqual(self._search("beatles queen"), [])
+        self.assertEqual(self._search(""), [])
+
+    def test_similarity_order(self) -> None:
+        longer = self._archive("Queen", "Bohemian Rhapsody, the Queen of all songs")
+        # the song whose field is closest to the query comes first
+        self.assertEqual(self._search("queen"), [longer.id, self.abba.id])
+
+    def test_short_terms(self) -> None:
+        # terms shorter than a trigram are checked against every song
+        self.assertEqual(self._search("ab"), [self.abba.id])
+        self.assertEqual(set(self._search("be")), {self.beatles.id, self.beach.id})
+
+    def test_catch_up(self) -> None:
+        self.assertEqual(self._search("vibrations"), [self.beach.id])
+        added = self._archive("Daft Punk", "Good Vibrations")
+        self.assertEqual(set(self._search("vibrations")), {self.beach.id, added.id})
+        # songs can be found by the queries that were used to request them
+        ArchivedQuery.objects.create(song=self.abba, query="swedish disco")
+        song_utils.archive_changed()
+        self.assertEqual(self._search("disco"), [self.abba.id])
+
+    def test_clear(self) -> None:
+        self.assertEqual(self._search("beatles"), [self.beatles.id])
+        ArchivedSong.objects.filter(id=self.beatles.id).update(artist="Beetles")
+        song_utils.archive_changed()
+        # changes to existing songs are only picked up after a rebuild
+        self.assertEqual(self._search("beatles"), [self.beatles.id])
+        song_index.clear()
+        self.assertEqual(self._search("beatles"), [])
+        self.assertEqual(self._search("beetles"), [self.beatles.id])
@@ -0,0 +1,116 @@
+from typing import List, Optional
+from unittest.mock import MagicMock, patch
+
+from core.models import QueuedSong
+from core.musiq import song_queue
+from core.musiq.song_provider import SongProvider
+from core.settings import storage
+from tests.raveberry_test import RaveberryTest
+
+
+def _metadata(title: str, confirmed: bool = True) -> dict:
+    return {
+        "artist": "artist",
+        "title": title,
+        "duration": 60,
+        "internal_url": f"file:///{title}" if confirmed else None,
+        "external_url": f"local_library/{title}",
+        "stream_url": None,
+    }
+
+
+class SongQueueTests(RaveberryTest):
+    def _enqueue(self, title: str, votes: int, confirmed: bool = True) -> QueuedSong:
+        return QueuedSong.objects.enqueue(
+            _metadata(title, confirmed), manually_requested=True, votes=votes
+        )
+
+    def _titles(self) -> List[str]:
+        return list(QueuedSong.objects.values_list("title", flat=True))
+
+    def _pop_all(self) -> List[Optional[str]]:
+        popped = []
+        while True:
+            song = QueuedSong.objects.pop_highest_voted()
+            if song is None:
+                return popped
+            popped.append(song.title)
+
+    def _check_pop_order(self) -> None:
+        self._enqueue("placeholder", 5, confirmed=False)
+        self._enqueue("first", 0)
+        self._enqueue("voted", 2)
+        self._enqueue("second", 0)
+        self._enqueue("downvoted", -1)
+
+        # highest votes first, equal votes in queue order, placeholders stay queued
+        self.assertEqual(self._pop_all(), ["voted", "first", "second", "downvoted"])
+        self.assertEqual(self._titles(), ["placeholder"])
+
+    def test_pop_highest_voted(self) -> None:
+        if not song_queue._can_delete_returning():
+            self.skipTest("DELETE ... RETURNING is not supported")
+        self._check_pop_order()
+
+    def test_pop_highest_voted_fallback(self) -> None:
+        with patch("core.musiq.song_queue._can_delete_returning", return_value=False):
+            self._check_pop_order()
+
+    def _check_shuffle(self) -> None:
+        titles = [f"song {index}" for index in range(20)]
+        for title in titles:
+            self._enqueue(title, 0)
+        QueuedSong.objects.shuffle()
+        songs = list(QueuedSong.objects.order_by("index"))
+        self.assertCountEqual([song.title for song in songs], titles)
+        # the songs are spaced like in a rebalanced queue
+        self.assertEqual(
+            [song.index for song in songs],
+            [position * song_queue.SPACING for position in range(1, len(titles) + 1)],
+        )
+
+    def test_shuffle(self) -> None:
+        if not song_queue._can_update_from():
+            self.skipTest("UPDATE ... FROM is not supported")
+        self._check_shuffle()
+
+    def test_shuffle_fallback(self) -> None:
+        with patch("core.musiq.song_queue._can_update_from", return_value=False):
+            self._check_shuffle()
+
+    def test_enqueue_many(self) -> None:
+        self._enqueue("queued", 0)
+        titles = ["first", "second", "third"]
+        songs = QueuedSong.objects.enqueue_many(
+            [_metadata(title) for title in titles], manually_requested=False
+        )
+        self.assertEqual([song.title for song in songs], titles)
+        self.assertEqual(self._titles(), ["queued"] + titles)
+
+    def test_enqueue_many_first(self) -> None:
+        self._enqueue("queued", 0)
+        titles = ["first", "second", "third"]
+        songs = QueuedSong.objects.enqueue_many(
+            [_metadata(title) for title in titles],
+            manually_requested=False,
+            enqueue_first=True,
+        )
+        self.assertEqual([song.title for song in songs], titles)
+        # the same order as enqueuing every song first on its own
+        self.assertEqual(self._titles(), titles[::-1] + ["queued"])
+
+    def test_request_many_queue_limit(self) -> None:
+        storage.put("max_queue_length", 2)
+        self._enqueue("queued", 0)
+        providers = []
+        for title in ["first", "second", "third"]:
+            provider = MagicMock(query=title, error=None)
+            provider.placeholder_metadata.return_value = _metadata(title, False)
+            providers.append(provider)
+        SongProvider.request_many(providers, "")
+        self.assertEqual(self._titles(), ["queued", "first"])
+        providers[0].prepare_request.return_value.delay.assert_called_once()
+        # the other songs are rejected like single requests
+        for provider in providers[1:]:
+            self.assertEqual(provider.error, "Queue limit reached")
+            provider.prepare_request.assert_not_called()
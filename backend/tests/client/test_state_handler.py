@@ -0,0 +1,174 @@
+import copy
+import random
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from core import redis, state_handler
+from core.musiq import musiq
+from tests.raveberry_test import RaveberryTest
+
+
+class StateCacheTests(RaveberryTest):
+    def setUp(self) -> None:
+        super().setUp()
+        # updates are sent explicitly
+        patch("core.state_handler.run_later").start()
+        self.addCleanup(patch.stopall)
+
+    def _etag(self, page: str) -> str:
+        response = self.client.get(reverse(f"{page}-state"))
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def _revalidate(self, page: str, etag: str) -> int:
+        return self.client.get(
+            reverse(f"{page}-state"), HTTP_IF_NONE_MATCH=etag
+        ).status_code
+
+    def test_pages_have_separate_generations(self) -> None:
+        lights_etag = self._etag("lights")
+        settings_etag = self._etag("settings")
+        state_handler.request_update("lights")
+        self.assertEqual(self._revalidate("lights", lights_etag), 200)
+        self.assertEqual(self._revalidate("settings", settings_etag), 304)
+
+    def test_base_update_outdates_every_page(self) -> None:
+        lights_etag = self._etag("lights")
+        settings_etag = self._etag("settings")
+        state_handler.request_update("base")
+        self.assertEqual(self._revalidate("lights", lights_etag), 200)
+        self.assertEqual(self._revalidate("settings", settings_etag), 200)
+
+    def test_state_keys_outdate_their_pages(self) -> None:
+        lights_etag = self._etag("lights")
+        settings_etag = self._etag("settings")
+        redis.put("current_fps", 42.0)
+        self.assertEqual(self._revalidate("lights", lights_etag), 200)
+        self.assertEqual(self._revalidate("settings", settings_etag), 304)
+        self.assertIn(
+            '"currentFps": "42.00"',
+            self.client.get(reverse("lights-state")).content.decode(),
+        )
+
+    def test_base_change_keeps_patched_state(self) -> None:
+        state_handler.send_state_patch("musiq", musiq.state_dict)
+        settings_etag = self._etag("settings")
+        original = musiq.state_dict
+
+        def changed_base():
+            state = original()
+            state["alarm"] = not state["alarm"]
+            return state
+
+        state_handler.invalidate_states("musiq")
+        cache = state_handler.send_state_patch("musiq", changed_base)
+        # the state of the other pages contains the changed base state
+        self.assertEqual(self._revalidate("settings", settings_etag), 200)
+        # the state that was just computed is still current
+        self.assertEqual(
+            state_handler._cached_state(
+                "musiq", state_handler._current_generation("musiq")
+            ),
+            cache,
+        )
+
+
+def _patch_list(
+    items: List[Dict[str, Any]], ops: Dict[str, List]
+) -> List[Dict[str, Any]]:
+    # the same steps as patchList in the frontend
+    by_id = {item["id"]: item for item in items}
+    for item_id, fields in ops["update"]:
+        by_id[item_id].update(fields)
+    detached = set(ops["remove"])
+    detached.update(value for kind, _, value in ops["place"] if kind == "move")
+    patched = [item for item in items if item["id"] not in detached]
+    for kind, position, value in ops["place"]:
+        patched.insert(position, value if kind == "insert" else by_id[value])
+    return patched
+
+
+def _apply_patch(state: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    # the same steps as applyPatch in the frontend
+    state = copy.deepcopy(state)
+    state.update(patch["base"])
+    page_state = state[patch["page"]]
+    page_state.update(patch["changes"])
+    for key, ops in patch["lists"].items():
+        page_state[key] = _patch_list(page_state[key], ops)
+    return state
+
+
+def _song(song_id: int, votes: int = 0, **extra: Any) -> Dict[str, Any]:
+    return {"id": song_id, "title": f"song {song_id}", "votes": votes, **extra}
+
+
+class DiffTests(SimpleTestCase):
+    def _state(self, queue: List[Dict[str, Any]], **changes: Any) -> Dict[str, Any]:
+        return {
+            "users": 1,
+            "musiq": {"paused": False, "songQueue": queue, **changes},
+        }
+
+    def _check_round_trip(self, old: Dict[str, Any], new: Dict[str, Any]) -> None:
+        patch = state_handler._diff("musiq", old, new)
+        self.assertIsNotNone(patch)
+        self.assertEqual(_apply_patch(old, patch), new)
+
+    def test_lists(self) -> None:
+        songs = [_song(song_id) for song_id in range(1, 6)]
+        cases = [
+            ([], songs),
+            (songs, []),
+            (songs, songs),
+            # inserts at the start, in the middle and at the end
+            (songs[1:], songs),
+            (songs[:2] + songs[3:], songs),
+            (songs[:-1], songs),
+            # removals
+            (songs, songs[1:]),
+            (songs, songs[:1] + songs[3:]),
+            # moves
+            (songs, songs[::-1]),
+            (songs, songs[1:] + songs[:1]),
+            (songs, [songs[3]] + songs[:3] + songs[4:]),
+            # everything at once
+            (songs, [_song(7), songs[4], songs[1], _song(6), songs[2]]),
+        ]
+        for old_queue, new_queue in cases:
+            with self.subTest(old=old_queue, new=new_queue):
+                self._check_round_trip(self._state(old_queue), self._state(new_queue))
+
+    def test_items(self) -> None:
+        old = self._state([_song(1), _song(2), _song(3)])
+        # changed fields are updated in place, changed keys replace the item
+        new = self._state(
+            [_song(2, votes=3), _song(1), _song(3, color="#ffffff")], paused=True
+        )
+        new["users"] = 2
+        self._check_round_trip(old, new)
+        patch = state_handler._diff("musiq", old, new)
+        self.assertEqual(patch["changes"], {"paused": True})
+        self.assertEqual(patch["base"], {"users": 2})
+        self.assertEqual(patch["lists"]["songQueue"]["update"], [[2, {"votes": 3}]])
+
+    def test_random_lists(self) -> None:
+        generator = random.Random(0)
+        for _ in range(200):
+            old_ids = generator.sample(range(20), generator.randint(0, 15))
+            new_ids = generator.sample(range(20), generator.randint(0, 15))
+            old_queue = [_song(song_id) for song_id in old_ids]
+            new_queue = [
+                _song(song_id, votes=generator.randint(0, 1)) for song_id in new_ids
+            ]
+            with self.subTest(old=old_ids, new=new_ids):
+                self._check_round_trip(self._state(old_queue), self._state(new_queue))
+
+    def test_incompatible_states(self) -> None:
+        old = self._state([_song(1)])
+        new = self._state([_song(1)], alarm=True)
+        # states with different keys are sent completely
+        self.assertIsNone(state_handler._diff("musiq", old, new))
@@ -0,0 +1,138 @@
+from typing import List
+from unittest.mock import patch
+
+from django.db import connection
+
+from core.models import ArchivedQuery, ArchivedSong
+from core.musiq import suggestions, song_utils
+from core.settings import storage
+from tests.raveberry_test import RaveberryTest
+
+
+def _archive(artist: str, title: str, counter: int = 1) -> ArchivedSong:
+    song = ArchivedSong.objects.create(
+        url=f"local_library/{artist}/{title}",
+        artist=artist,
+        title=title,
+        duration=60,
+        counter=counter,
+        cached=True,
+    )
+    song_utils.archive_changed()
+    return song
+
+
+class OfflineSuggestionTests(RaveberryTest):
+    def _suggest(self, query: str) -> List[str]:
+        results, _ = suggestions._offline_song_suggestions(query)
+        return [result["value"] for result in results]
+
+    def setUp(self) -> None:
+        super().setUp()
+        if connection.vendor != "sqlite":
+            self.skipTest("full text search and the song index are only used by SQLite")
+        _archive("The Beatles", "Let It Be")
+        _archive("Beach Boys", "Good Vibrations", counter=5)
+        _archive("ABBA", "Dancing Queen")
+        # only found by the query it was requested with
+        disco = _archive("Bee Gees", "Stayin' Alive")
+        ArchivedQuery.objects.create(song=disco, query="queen of disco")
+
+    def _check_matching(self) -> None:
+        # terms match the beginning of words, popular songs first for equal matches
+        self.assertEqual(
+            self._suggest("bea"),
+            ["Beach Boys – Good Vibrations", "The Beatles – Let It Be"],
+        )
+        self.assertEqual(self._suggest("beatles let"), ["The Beatles – Let It Be"])
+        self.assertEqual(self._suggest("disco"), ["Bee Gees – Stayin' Alive"])
+        self.assertEqual(self._suggest("beatles queen"), [])
+
+    def test_full_text_search(self) -> None:
+        if not suggestions._fts_available():
+            self.skipTest("SQLite was built without FTS5")
+        self._check_matching()
+        # matches in artist or title rank higher than matches in queries
+        self.assertEqual(
+            self._suggest("queen"),
+            ["ABBA – Dancing Queen", "Bee Gees – Stayin' Alive"],
+        )
+        # terms are never interpreted as operators or syntax
+        self.assertEqual(self._suggest("queen OR disco"), [])
+        self.assertEqual(self._suggest("NOT"), [])
+        self.assertEqual(self._suggest('"dancing'), ["ABBA – Dancing Queen"])
+        self.assertEqual(self._suggest("let* (it"), ["The Beatles – Let It Be"])
+
+    def test_forbidden_songs(self) -> None:
+        storage.put("forbidden_keywords", "beatles")
+        _archive("The Beatles", "Help!")
+        self.assertEqual(self._suggest("help"), [])
+
+    def test_song_index_fallback(self) -> None:
+        with patch("core.musiq.suggestions._fts_available", return_value=False):
+            self._check_matching()
+            self.assertEqual(
+                self._suggest("queen"),
+                ["ABBA – Dancing Queen", "Bee Gees – Stayin' Alive"],
+            )
+
+
+class SuggestionCacheTests(RaveberryTest):
+    def setUp(self) -> None:
+        super().setUp()
+        _archive("ABBA", "Dancing Queen")
+        self.compute = patch(
+            "core.musiq.suggestions._offline_song_suggestions",
+            wraps=suggestions._offline_song_suggestions,
+        ).start()
+        self.addCleanup(patch.stopall)
+
+    def _suggest(self, query: str) -> List[str]:
+        results = suggestions._cached_offline_suggestions(query, False)
+        return [result["value"] for result in results]
+
+    def _counters(self):
+        counters = suggestions.suggestion_cache_counters()
+        return counters["hits"], counters["misses"]
+
+    def test_hit_and_miss(self) -> None:
+        self.assertEqual(self._suggest("queen"), ["ABBA – Dancing Queen"])
+        self.assertEqual(self._counters(), (0, 1))
+        # case and whitespace do not matter
+        self.assertEqual(self._suggest(" Queen "), ["ABBA – Dancing Queen"])
+        self.assertEqual(self._counters(), (1, 1))
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_refinement(self) -> None:
+        if connection.vendor == "postgresql":
+            self.skipTest("trigram similarity does not allow refining cached queries")
+        self.assertEqual(self._suggest("beatl"), [])
+        # the extended queries can not have suggestions either
+        self.assertEqual(self._suggest("beatles"), [])
+        self.assertEqual(self._suggest("beatles help"), [])
+        self.assertEqual(self._counters(), (2, 1))
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_refinement_of_incomplete_results(self) -> None:
+        storage.put("number_of_suggestions", 1)
+        _archive("ABBA", "Waterloo")
+        # not all matches fit into the suggestions, so refining is not possible
+        self.assertEqual(len(self._suggest("abba")), 1)
+        self.assertEqual(self._suggest("abba waterloo"), ["ABBA – Waterloo"])
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_song_change_invalidates(self) -> None:
+        self.assertEqual(self._suggest("waterloo"), [])
+        _archive("ABBA", "Waterloo")
+        self.assertEqual(self._suggest("waterloo"), ["ABBA – Waterloo"])
+        # refinements of queries cached before the change are recomputed as well
+        self.assertEqual(self._suggest("waterloo abba"), ["ABBA – Waterloo"])
+        self.assertEqual(self._counters(), (0, 3))
+
+    def test_setting_change_invalidates(self) -> None:
+        self.assertEqual(self._suggest("queen"), ["ABBA – Dancing Queen"])
+        storage.put("forbidden_keywords", "abba")
+        # changing the forbidden keywords updates the songs in the background
+        ArchivedSong.objects.update(forbidden=True)
+        self.assertEqual(self._suggest("queen"), [])
+        self.assertEqual(self._counters(), (0, 2))
@@ -0,0 +1,26 @@
+from unittest.mock import patch
+
+from django.urls import reverse
+
+from core import base, redis
+from core.models import Counter
+from tests.raveberry_test import RaveberryTest
+
+
+class VisitorTests(RaveberryTest):
+    def setUp(self) -> None:
+        super().setUp()
+        # the count is written explicitly
+        patch("core.base.run_later").start()
+        self.addCleanup(patch.stopall)
+
+    def test_flush_before_start(self) -> None:
+        for _ in range(3):
+            self.client.get(reverse("musiq"))
+        self.assertEqual(base.get_visitors(), 3)
+        self.assertEqual(Counter.objects.get(id=1).value, 0)
+
+        # shutting down writes the count, so clearing redis keeps it
+        base.flush_visitors()
+        redis.start()
+        self.assertEqual(base.get_visitors(), 3)
@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+from django.urls import reverse
+
+from core import user_manager
+from core.models import QueuedSong
+from core.musiq import playback
+from core.settings import storage
+from tests.raveberry_test import RaveberryTest
+
+
+class VotingTests(RaveberryTest):
+    def setUp(self) -> None:
+        super().setUp()
+        storage.put("interactivity", storage.Interactivity.full_voting)
+        self.songs = [
+            QueuedSong.objects.enqueue(
+                {
+                    "artist": "artist",
+                    "title": title,
+                    "duration": 60,
+                    "internal_url": f"file:///{title}",
+                    "external_url": f"local_library/{title}",
+                    "stream_url": None,
+                },
+                manually_requested=True,
+            )
+            for title in ["first", "second", "third"]
+        ]
+        # votes stay buffered unless they are flushed explicitly
+        self.run_later = patch("core.musiq.controller.run_later").start()
+        self.addCleanup(patch.stopall)
+
+    def _vote(self, song: QueuedSong, amount: int) -> None:
+        response = self.client.post(
+            reverse("vote"), {"key": str(song.id), "amount": str(amount)}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_votes_are_buffered(self) -> None:
+        self._vote(self.songs[1], 1)
+        self.run_later.assert_called_once()
+        self.assertEqual(QueuedSong.objects.get(id=self.songs[1].id).votes, 0)
+
+    def test_next_song_sees_buffered_votes(self) -> None:
+        self._vote(self.songs[2], 1)
+        self._vote(self.songs[2], 1)
+        self._vote(self.songs[1], 1)
+
+        current_song, recovered = playback.Playback()._get_next_song()
+        self.assertFalse(recovered)
+        self.assertEqual(current_song.title, "third")
+        self.assertEqual(current_song.votes, 2)
+        self.assertEqual(QueuedSong.objects.get(id=self.songs[1].id).votes, 1)
+
+    def test_downvotes_kick_immediately(self) -> None:
+        storage.put("downvotes_to_kick", 2)
+        self._vote(self.songs[0], -1)
+        self.assertTrue(QueuedSong.objects.filter(id=self.songs[0].id).exists())
+        # the second downvote reaches the threshold together with the buffered one
+        self._vote(self.songs[0], -1)
+        self.assertFalse(QueuedSong.objects.filter(id=self.songs[0].id).exists())
+        self.assertEqual(QueuedSong.objects.count(), 2)
+
+    def _engagement(self, song: QueuedSong) -> dict:
+        return user_manager.get_engagements([song.id])[0][1]
+
+    def test_engagement_accounting(self) -> None:
+        storage.put("color_indication", storage.Privileges.everybody)
+        song = self.songs[0]
+        self._vote(song, 1)
+        session_key = self.client.session.session_key
+        self.assertEqual(self._engagement(song), {session_key: 1})
+        # repeated votes are clamped
+        self._vote(song, 1)
+        self.assertEqual(self._engagement(song), {session_key: 1})
+        # changing the vote from up to down
+        self._vote(song, -2)
+        self.assertEqual(self._engagement(song), {session_key: -1})
+        # undoing the vote removes the session from the engagement
+        self._vote(song, 1)
+        self.assertEqual(self._engagement(song), {})
+
+    def test_ip_votes(self) -> None:
+        storage.put("ip_checking", True)
+        song = self.songs[0]
+        self._vote(song, 1)
+        response = self.client.post(
+            reverse("vote"), {"key": str(song.id), "amount": "1"}
+        )
+        self.assertEqual(response.status_code, 400)
+        # changing and undoing votes stays possible
+        self._vote(song, -2)
+        self._vote(song, 1)
+        self._vote(song, 1)
@@ -8,6 +8,8 @@ from django.test import Client, TransactionTestCase
 from django.urls import reverse
 
 from core import redis
+from core.musiq import song_index
+from core.settings import storage
 from core.tasks import app
 from tests import util
 
@@ -38,6 +40,9 @@ class RaveberryTest(TransactionTestCase):
         # they will drop privileges if necessary
         util.admin_login(self.client)
         redis.start()
+        # settings are cached indefinitely, but the database is flushed after every test
+        storage.clear_cache()
+        song_index.clear()
 
     def _poll_state(
         self,
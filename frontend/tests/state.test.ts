@@ -0,0 +1,85 @@
+import * as base from '@src/base';
+
+// patches were computed by the server (state_handler._diff) for these states
+const song = (id, votes = 0) => ({'id': id, 'title': 'song ' + id, 'votes': votes});
+
+const oldState = {
+  'users': 1,
+  'musiq': {'paused': false, 'songQueue': [song(1), song(2), song(3), song(4)]},
+};
+const newState = {
+  'users': 2,
+  'musiq': {'paused': true, 'songQueue': [song(5), song(4), song(2, 1), song(3)]},
+};
+const newerState = {
+  'users': 2,
+  'musiq': {'paused': true, 'songQueue': [song(4), song(2, 1), song(3), song(6)]},
+};
+
+// inserts, a move, a removal and an update
+const patch = {
+  'page': 'musiq',
+  'base': {'users': 2},
+  'changes': {'paused': true},
+  'lists': {'songQueue': {
+    'remove': [1],
+    'update': [[2, {'votes': 1}]],
+    'place': [['insert', 0, song(5)], ['move', 1, 4]],
+  }},
+};
+const nextPatch = {
+  'page': 'musiq',
+  'base': {'users': 2},
+  'changes': {},
+  'lists': {'songQueue': {
+    'remove': [5],
+    'update': [],
+    'place': [['insert', 3, song(6)]],
+  }},
+};
+
+let received;
+base.registerSpecificState((state) => {
+  received = state;
+});
+
+const copy = (state) => JSON.parse(JSON.stringify(state));
+
+beforeEach(() => {
+  received = null;
+});
+
+test('patches turn the old state into the new one', () => {
+  base.receiveState({...copy(oldState), 'page': 'musiq', 'version': 1});
+  expect(received).toEqual(oldState);
+  base.receiveState({...copy(patch), 'version': 2});
+  expect(received).toEqual(newState);
+  base.receiveState({...copy(nextPatch), 'version': 3});
+  expect(received).toEqual(newerState);
+});
+
+test('patches that were already applied are ignored', () => {
+  base.receiveState({...copy(oldState), 'page': 'musiq', 'version': 1});
+  base.receiveState({...copy(patch), 'version': 2});
+  received = null;
+  base.receiveState({...copy(patch), 'version': 2});
+  expect(received).toBeNull();
+});
+
+test('missed patches resync the state', () => {
+  base.receiveState({...copy(oldState), 'page': 'musiq', 'version': 1});
+
+  // the state endpoint returns the state that contains the missed patch
+  const get = jest.fn().mockImplementation((url, callback) => {
+    callback(copy(newState), 'success', {getResponseHeader: () => '2'});
+    return $.Deferred().resolve();
+  });
+  $.get = get;
+
+  // patch 2 was missed
+  received = null;
+  base.receiveState({...copy(nextPatch), 'version': 3});
+  expect(get).toHaveBeenCalledTimes(1);
+  // the resynced state and the pending patch are applied
+  expect(received).toEqual(newerState);
+});
@@ -216,10 +216,113 @@ export function updateState(newState) {
   }
 }
 
+// the last versioned state and its version, patches are applied to it
+let versionedState = null;
+let stateVersion = null;
+let resyncing = false;
+let pendingPatches = [];
+
+/** Applies a versioned full state and all pending patches that follow it.
+ * @param {Object} state the state that was received
+ * @param {number} version the version of the state
+ */
+function setVersionedState(state, version) {
+  stateVersion = version;
+  delete state.version;
+  delete state.page;
+  versionedState = state;
+  updateState(jQuery.extend(true, {}, versionedState));
+  const patches = pendingPatches;
+  pendingPatches = [];
+  for (const patch of patches) {
+    applyPatch(patch);
+  }
+}
+
+/** Applies the operations of a list patch to the given list.
+ * @param {Array} list the list of items that is changed
+ * @param {Object} ops the removals, updates and placements for this list
+ * @return {Array} the patched list
+ */
+function patchList(list, ops) {
+  const items = new Map();
+  for (const item of list) {
+    items.set(item.id, item);
+  }
+  for (const [id, fields] of ops.update) {
+    Object.assign(items.get(id), fields);
+  }
+  const detached = new Set(ops.remove);
+  for (const [kind, , id] of ops.place) {
+    if (kind == 'move') {
+      detached.add(id);
+    }
+  }
+  const patched = list.filter((item) => !detached.has(item.id));
+  for (const [kind, position, value] of ops.place) {
+    patched.splice(position, 0, kind == 'insert' ? value : items.get(value));
+  }
+  return patched;
+}
+
+/** Applies a patch to the versioned state if it is the next one.
+ * Resyncs with the server if a patch was missed.
+ * @param {Object} patch the patch that was received
+ */
+function applyPatch(patch) {
+  if (stateVersion !== null && patch.version <= stateVersion) {
+    // this patch is already contained in the current state
+    return;
+  }
+  if (stateVersion === null || patch.version != stateVersion + 1) {
+    pendingPatches.push(patch);
+    if (!resyncing) {
+      getState();
+    }
+    return;
+  }
+  Object.assign(versionedState, patch.base);
+  const pageState = versionedState[patch.page];
+  Object.assign(pageState, patch.changes);
+  for (const key of Object.keys(patch.lists)) {
+    pageState[key] = patchList(pageState[key], patch.lists[key]);
+  }
+  stateVersion = patch.version;
+  updateState(jQuery.extend(true, {}, versionedState));
+}
+
+/** Handles a state message received through the websocket.
+ * @param {Object} message either a full state or a patch to the last state
+ */
+export function receiveState(message) {
+  if (!('changes' in message)) {
+    if ('version' in message) {
+      setVersionedState(message, message.version);
+    } else {
+      updateState(message);
+    }
+    return;
+  }
+  if (resyncing) {
+    pendingPatches.push(message);
+    return;
+  }
+  applyPatch(message);
+}
+
 /** Requests a state update from the server and applies it. */
 export function getState() {
-  $.get(urls['state'], function(state) {
-    updateState(state);
+  resyncing = true;
+  $.get(urls['state'], function(state, status, xhr) {
+    resyncing = false;
+    const version = xhr.getResponseHeader('X-State-Version');
+    if (version !== null) {
+      setVersionedState(state, parseInt(version));
+    } else {
+      updateState(state);
+    }
+  }).fail(function() {
+    resyncing = false;
   });
 }
 
@@ -1,7 +1,7 @@
 import ReconnectingWebSocket from 'reconnecting-websocket';
-import {updateState, reconnect} from './base.js';
+import {receiveState, reconnect} from './base.js';
 
-let socketUrl = window.location.host + '/state/';
+let socketUrl = window.location.host + '/state/' + PAGE + '/';
 if (window.location.protocol == 'https:') {
   socketUrl = 'wss://' + socketUrl;
 } else {
@@ -11,8 +11,8 @@ const stateSocket = new ReconnectingWebSocket(socketUrl, [], {});
 let unloading = false;
 
 stateSocket.addEventListener('message', (e) => {
-  const newState = JSON.parse(e.data);
-  updateState(newState);
+  const message = JSON.parse(e.data);
+  receiveState(message);
 });
 
 let firstConnect = true;
@@ -12,6 +12,7 @@ declare const COLOR_INDICATION: boolean;
 // needs to be writable for tests
 declare let ADMIN: boolean;
 declare const CONTROLS_ENABLED: boolean;
+declare const PAGE: string;
 
 declare const ADDITIONAL_KEYWORDS: string;
 declare const FORBIDDEN_KEYWORDS: string;